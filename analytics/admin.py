@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import UserAnalytics
+from .models import DailyUserRollup, UserAnalytics
 
 @admin.register(UserAnalytics)
 class UserAnalyticsAdmin(admin.ModelAdmin):
@@ -9,3 +9,12 @@ class UserAnalyticsAdmin(admin.ModelAdmin):
     search_fields = ['user__username', 'user__email']
     ordering = ['-last_active_date']
     readonly_fields = ['created_at', 'updated_at']
+
+
+@admin.register(DailyUserRollup)
+class DailyUserRollupAdmin(admin.ModelAdmin):
+    """Админка для дневных сводок"""
+    list_display = ['user', 'date', 'completed_count', 'skipped_count', 'partial_count', 'value_sum']
+    list_filter = ['date']
+    search_fields = ['user__username', 'user__email']
+    readonly_fields = ['updated_at']
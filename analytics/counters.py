@@ -0,0 +1,109 @@
+"""
+Счётчики UserAnalytics: выполнения по дням недели, число активных дней
+и дата последней активности.
+
+Активный день — день, в котором есть хотя бы одно выполнение, то есть
+дневная сводка с completed_count > 0. Счётчики меняются F-выражениями
+по изменениям сводок (update_user_analytics); полный пересчёт одним
+сгруппированным запросом по логам — store_user_analytics.
+"""
+from django.db.models import Count, F, Max, Q, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import DailyUserRollup, UserAnalytics
+
+# date.weekday() -> счётчик выполнений за этот день недели
+WEEKDAY_FIELDS = [
+    'monday_completions',
+    'tuesday_completions',
+    'wednesday_completions',
+    'thursday_completions',
+    'friday_completions',
+    'saturday_completions',
+    'sunday_completions',
+]
+
+ANALYTICS_FIELDS = [*WEEKDAY_FIELDS, 'total_days_active', 'last_active_date']
+
+
+def compute_user_analytics(user_ids, logs=None):
+    """
+    Посчитать счётчики аналитики по логам одним сгруппированным запросом.
+
+    Возвращает {user_id: {поле: значение}} для всех переданных пользователей.
+    ``logs`` — QuerySet логов, по умолчанию все HabitLog (миграции
+    передают историческую модель).
+    """
+    if logs is None:
+        from habits.models import HabitLog
+
+        logs = HabitLog.objects.all()
+
+    completed = Q(status='completed')
+    annotations = {
+        # ExtractWeekDay: 1 — воскресенье, 2 — понедельник, ...
+        field: Count('id', filter=completed & Q(date__week_day=(weekday + 1) % 7 + 1))
+        for weekday, field in enumerate(WEEKDAY_FIELDS)
+    }
+    rows = logs.filter(user_id__in=user_ids).order_by().values('user_id').annotate(
+        total_days_active=Count('date', filter=completed, distinct=True),
+        last_active_date=Max('date', filter=completed),
+        **annotations,
+    )
+
+    result = {user_id: dict.fromkeys(ANALYTICS_FIELDS, 0) | {'last_active_date': None} for user_id in user_ids}
+    for row in rows:
+        result[row['user_id']] = {field: row[field] for field in ANALYTICS_FIELDS}
+    return result
+
+
+def store_user_analytics(user_ids, batch_size=1000, logs=None, model=UserAnalytics):
+    """
+    Пересчитать и сохранить аналитику набора пользователей (upsert).
+
+    ``logs`` — как в compute_user_analytics, ``model`` — класс
+    UserAnalytics; миграции передают исторические модели.
+    """
+    stats = compute_user_analytics(list(user_ids), logs)
+    model.objects.bulk_create(
+        [model(user_id=user_id, **fields) for user_id, fields in stats.items()],
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=['user'],
+        update_fields=ANALYTICS_FIELDS + ['updated_at'],
+    )
+    return len(stats)
+
+
+def update_user_analytics(user_id, completed_deltas, became_active=(), became_inactive=()):
+    """
+    Применить изменения дневных сводок к аналитике пользователя.
+
+    ``completed_deltas`` — {дата: изменение числа выполнений};
+    ``became_active``/``became_inactive`` — дни, в которых появилось первое
+    или исчезло последнее выполнение. Вызывается после записи сводок.
+    """
+    updates = {}
+    for date, change in completed_deltas.items():
+        field = WEEKDAY_FIELDS[date.weekday()]
+        updates[field] = updates.get(field, 0) + change
+    updates = {field: F(field) + change for field, change in updates.items() if change}
+
+    active_change = len(became_active) - len(became_inactive)
+    if active_change:
+        updates['total_days_active'] = F('total_days_active') + active_change
+    if became_inactive:
+        # Последний активный день мог пропасть — берём его из сводок
+        updates['last_active_date'] = Subquery(
+            DailyUserRollup.objects.filter(user_id=user_id, completed_count__gt=0)
+            .order_by('-date').values('date')[:1]
+        )
+    elif became_active:
+        latest = max(became_active)
+        updates['last_active_date'] = Greatest(Coalesce('last_active_date', latest), latest)
+    if not updates:
+        return
+
+    if not UserAnalytics.objects.filter(user_id=user_id).update(**updates):
+        # Аналитики ещё нет — считаем её целиком, изменение уже в логах
+        store_user_analytics([user_id])
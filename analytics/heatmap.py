@@ -0,0 +1,106 @@
+"""
+Годовая тепловая карта привычки в компактном виде.
+
+Статус каждого дня года кодируется двумя битами (STATUS_CODES) и
+отдаётся одной из двух строк — какая короче:
+
+* ``bitmap`` — base64 от упакованных кодов, 4 дня на байт, первый день
+  года в старших битах первого байта; нулевые байты в конце отброшены;
+* ``rle`` — серии вида ``<длина><символ>`` (длина 1 не пишется),
+  символы — RLE_SYMBOLS, например ``120-3c2-s``.
+
+Дни после конца данных — без отметки. Карты кэшируются по
+(привычка, год) и сбрасываются при записи логов.
+"""
+import base64
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+
+STATUS_CODES = {
+    None: 0,
+    'completed': 1,
+    'partial': 2,
+    'skipped': 3,
+}
+
+RLE_SYMBOLS = '-cps'
+
+
+def heatmap_cache_key(habit_id, year):
+    return f'heatmap:{habit_id}:{year}'
+
+
+def invalidate_heatmaps(pairs):
+    """Сбросить карты для пар (привычка, дата)"""
+    cache.delete_many({heatmap_cache_key(habit_id, day.year) for habit_id, day in pairs})
+
+
+def encode_bitmap(codes):
+    packed = bytearray((len(codes) + 3) // 4)
+    for index, code in enumerate(codes):
+        packed[index // 4] |= code << (6 - 2 * (index % 4))
+    return base64.b64encode(bytes(packed).rstrip(b'\0')).decode()
+
+
+def encode_rle(codes):
+    runs = []
+    index = 0
+    while index < len(codes):
+        end = index
+        while end < len(codes) and codes[end] == codes[index]:
+            end += 1
+        length = end - index
+        runs.append(f"{length if length > 1 else ''}{RLE_SYMBOLS[codes[index]]}")
+        index = end
+    return ''.join(runs)
+
+
+def encode_year(year, statuses):
+    """Закодировать {дата: статус} за год. Возвращает словарь для ответа"""
+    start = date(year, 1, 1)
+    days = (date(year + 1, 1, 1) - start).days
+    codes = [STATUS_CODES[statuses.get(start + timedelta(days=offset))] for offset in range(days)]
+    # Хвост без отметок не кодируем
+    while codes and not codes[-1]:
+        codes.pop()
+
+    bitmap = encode_bitmap(codes)
+    rle = encode_rle(codes)
+    if len(rle) < len(bitmap):
+        return {'encoding': 'rle', 'data': rle}
+    return {'encoding': 'bitmap', 'data': bitmap}
+
+
+def year_heatmaps(habit_ids, year):
+    """
+    Карты набора привычек за год: {habit_id: {'encoding', 'data'}}.
+
+    Недостающие в кэше карты строятся одним упорядоченным проходом по логам.
+    """
+    from habits.models import HabitLog
+
+    keys = {habit_id: heatmap_cache_key(habit_id, year) for habit_id in habit_ids}
+    cached = cache.get_many(keys.values())
+    result = {habit_id: cached[key] for habit_id, key in keys.items() if key in cached}
+    missing = [habit_id for habit_id in habit_ids if habit_id not in result]
+    if not missing:
+        return result
+
+    statuses = {habit_id: {} for habit_id in missing}
+    logs = HabitLog.objects.filter(
+        habit_id__in=missing,
+        date__gte=date(year, 1, 1),
+        date__lte=date(year, 12, 31),
+    ).order_by('habit_id', 'date').values_list('habit_id', 'date', 'status')
+    for habit_id, day, status in logs:
+        statuses[habit_id][day] = status
+
+    fresh = {habit_id: encode_year(year, statuses[habit_id]) for habit_id in missing}
+    cache.set_many(
+        {keys[habit_id]: heatmap for habit_id, heatmap in fresh.items()},
+        settings.HEATMAP_CACHE_TIMEOUT,
+    )
+    result.update(fresh)
+    return result
@@ -0,0 +1,12 @@
+from analytics.counters import store_user_analytics
+from users.management.batching import UserBatchCommand
+
+class Command(UserBatchCommand):
+    help = 'Пересчитать счётчики аналитики пользователей по логам'
+    batch_help = 'Сколько пользователей пересчитывать за один проход'
+
+    def handle_batch(self, batch):
+        return store_user_analytics(batch)
+
+    def report(self, processed, total):
+        return f'Аналитика пересчитана для {total} пользователей'
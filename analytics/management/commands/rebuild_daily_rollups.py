@@ -0,0 +1,13 @@
+from analytics.rollups import rebuild_rollups
+from users.management.batching import UserBatchCommand
+
+class Command(UserBatchCommand):
+    help = 'Перестроить дневные сводки логов пользователей'
+    default_batch_size = 200
+    batch_help = 'Сколько пользователей перестраивать за один проход'
+
+    def handle_batch(self, batch):
+        return rebuild_rollups(batch)
+
+    def report(self, processed, total):
+        return f'Перестроено {total} сводок для {processed} пользователей'
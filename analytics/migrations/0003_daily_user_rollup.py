@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:33
+
+import django.db.models.deletion
+import habit_tracker.settings
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0002_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyUserRollup',
+            fields=[
+                ('id', models.UUIDField(default=habit_tracker.settings.uuid7, editable=False, primary_key=True, serialize=False)),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('completed_count', models.PositiveIntegerField(default=0, verbose_name='Выполнено')),
+                ('skipped_count', models.PositiveIntegerField(default=0, verbose_name='Пропущено')),
+                ('partial_count', models.PositiveIntegerField(default=0, verbose_name='Частично')),
+                ('value_sum', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Сумма значений')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Сводка за день',
+                'verbose_name_plural': 'Сводки за день',
+                'ordering': ['-date'],
+                'unique_together': {('user', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.db import migrations, transaction
+
+from analytics.rollups import _aggregate_logs
+
+BATCH_SIZE = 200
+
+
+def backfill_daily_rollups(apps, schema_editor):
+    """Построить дневные сводки по логам порциями по BATCH_SIZE пользователей"""
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    HabitLog = apps.get_model('habits', 'HabitLog')
+    DailyUserRollup = apps.get_model('analytics', 'DailyUserRollup')
+    cursor = None
+    while True:
+        users = User.objects.order_by('pk')
+        if cursor is not None:
+            users = users.filter(pk__gt=cursor)
+        user_ids = list(users.values_list('pk', flat=True)[:BATCH_SIZE])
+        if not user_ids:
+            break
+        rollups = _aggregate_logs(HabitLog.objects.filter(user_id__in=user_ids), DailyUserRollup)
+        with transaction.atomic():
+            DailyUserRollup.objects.filter(user_id__in=user_ids).delete()
+            DailyUserRollup.objects.bulk_create(rollups, batch_size=1000)
+        cursor = user_ids[-1]
+
+
+class Migration(migrations.Migration):
+    # Каждая порция коммитится отдельно, чтобы не держать длинную транзакцию
+    atomic = False
+
+    dependencies = [
+        ('analytics', '0003_daily_user_rollup'),
+        ('habits', '0009_habitlog_user_not_null'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_daily_rollups, migrations.RunPython.noop),
+    ]
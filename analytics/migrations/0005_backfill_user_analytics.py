@@ -0,0 +1,38 @@
+from django.db import migrations
+
+from analytics.counters import store_user_analytics
+
+BATCH_SIZE = 1000
+
+
+def backfill_user_analytics(apps, schema_editor):
+    """
+    Пересчитать существующие записи UserAnalytics по логам порциями по
+    BATCH_SIZE пользователей: прежний get_or_create оставлял в них нули,
+    к которым инкрементальные счётчики прибавляли бы изменения
+    """
+    HabitLog = apps.get_model('habits', 'HabitLog')
+    UserAnalytics = apps.get_model('analytics', 'UserAnalytics')
+    cursor = None
+    while True:
+        rows = UserAnalytics.objects.order_by('user_id')
+        if cursor is not None:
+            rows = rows.filter(user_id__gt=cursor)
+        user_ids = list(rows.values_list('user_id', flat=True)[:BATCH_SIZE])
+        if not user_ids:
+            break
+        store_user_analytics(user_ids, logs=HabitLog.objects.all(), model=UserAnalytics)
+        cursor = user_ids[-1]
+
+
+class Migration(migrations.Migration):
+    # Каждая порция коммитится отдельно, чтобы не держать длинную транзакцию
+    atomic = False
+
+    dependencies = [
+        ('analytics', '0004_backfill_daily_rollups'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_user_analytics, migrations.RunPython.noop),
+    ]
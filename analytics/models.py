@@ -26,3 +26,24 @@ class UserAnalytics(models.Model):
 
     def __str__(self):
         return f"Аналитика {self.user.username}"
+
+
+class DailyUserRollup(models.Model):
+    """Сводка логов пользователя за день — поддерживается при записи логов"""
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_rollups')
+    date = models.DateField(verbose_name='Дата')
+    completed_count = models.PositiveIntegerField(default=0, verbose_name='Выполнено')
+    skipped_count = models.PositiveIntegerField(default=0, verbose_name='Пропущено')
+    partial_count = models.PositiveIntegerField(default=0, verbose_name='Частично')
+    value_sum = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name='Сумма значений')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Сводка за день'
+        verbose_name_plural = 'Сводки за день'
+        unique_together = ['user', 'date']
+        ordering = ['-date']
+
+    def __str__(self):
+        return f"{self.user.username} - {self.date}"
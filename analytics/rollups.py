@@ -0,0 +1,155 @@
+"""
+Дневные сводки логов пользователя (DailyUserRollup).
+
+Сводка за день хранит количество логов по статусам и сумму значений.
+Одиночные записи логов меняют её инкрементально через F-выражения
+(apply_log_delta), пакетные — пересчётом затронутых дней (refresh_rollups).
+Изменения числа выполнений за день передаются в счётчики UserAnalytics,
+кэш статистики пользователя сбрасывается после коммита записи.
+Полная перестройка — команда rebuild_daily_rollups.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce
+
+from users.stats import invalidate_user_stats_on_commit
+
+from .counters import update_user_analytics
+from .models import DailyUserRollup
+
+# Статус лога -> счётчик сводки
+STATUS_FIELDS = {
+    'completed': 'completed_count',
+    'skipped': 'skipped_count',
+    'partial': 'partial_count',
+}
+
+ROLLUP_FIELDS = [*STATUS_FIELDS.values(), 'value_sum']
+
+
+def log_state(log):
+    """Состояние лога, влияющее на сводку: (дата, статус, значение)"""
+    return log.date, log.status, log.value
+
+
+def apply_log_delta(user_id, old=None, new=None):
+    """
+    Инкрементально обновить сводки после изменения лога.
+
+    ``old`` и ``new`` — состояния (дата, статус, значение) до и после;
+    None означает, что лога не было (создание) или больше нет (удаление).
+    """
+    deltas = defaultdict(lambda: defaultdict(int))
+    for state, sign in ((old, -1), (new, 1)):
+        if state is None:
+            continue
+        date, status, value = state
+        deltas[date][STATUS_FIELDS[status]] += sign
+        deltas[date]['value_sum'] += sign * (value or 0)
+
+    completed_deltas = {}
+    became_active = []
+    became_inactive = []
+    for date, delta in deltas.items():
+        delta = {field: change for field, change in delta.items() if change}
+        if not delta:
+            continue
+        updates = {field: F(field) + change for field, change in delta.items()}
+        rollups = DailyUserRollup.objects.filter(user_id=user_id, date=date)
+        if not rollups.update(**updates):
+            try:
+                with transaction.atomic():
+                    DailyUserRollup.objects.create(
+                        user_id=user_id,
+                        date=date,
+                        **{field: max(change, 0) for field, change in delta.items()},
+                    )
+            except IntegrityError:
+                # Сводку за этот день успел создать параллельный запрос
+                rollups.update(**updates)
+
+        change = delta.get('completed_count')
+        if change:
+            completed_deltas[date] = change
+            after = rollups.values_list('completed_count', flat=True).first() or 0
+            _track_activity(date, after - change, after, became_active, became_inactive)
+
+    if completed_deltas:
+        update_user_analytics(user_id, completed_deltas, became_active, became_inactive)
+    invalidate_user_stats_on_commit(user_id)
+
+
+def _track_activity(date, before, after, became_active, became_inactive):
+    """Отметить день, ставший активным или переставший им быть"""
+    if before <= 0 < after:
+        became_active.append(date)
+    elif after <= 0 < before:
+        became_inactive.append(date)
+
+
+def _aggregate_logs(logs, model=DailyUserRollup):
+    """
+    Сгруппировать логи по (пользователь, дата) в несохранённые сводки.
+
+    ``model`` — класс сводки; миграции передают историческую модель.
+    """
+    rows = logs.order_by().values('user_id', 'date').annotate(
+        completed=Count('id', filter=Q(status='completed')),
+        skipped=Count('id', filter=Q(status='skipped')),
+        partial=Count('id', filter=Q(status='partial')),
+        total_value=Coalesce(Sum('value'), Decimal(0)),
+    )
+    return [
+        model(
+            user_id=row['user_id'],
+            date=row['date'],
+            completed_count=row['completed'],
+            skipped_count=row['skipped'],
+            partial_count=row['partial'],
+            value_sum=row['total_value'],
+        )
+        for row in rows
+    ]
+
+
+def refresh_rollups(user_id, dates):
+    """Пересчитать сводки пользователя за указанные дни по логам"""
+    from habits.models import HabitLog
+
+    dates = set(dates)
+    if not dates:
+        return 0
+    existing = DailyUserRollup.objects.filter(user_id=user_id, date__in=dates)
+    rollups = _aggregate_logs(HabitLog.objects.filter(user_id=user_id, date__in=dates))
+    with transaction.atomic():
+        before = dict(existing.values_list('date', 'completed_count'))
+        existing.delete()
+        DailyUserRollup.objects.bulk_create(rollups)
+
+        after = {rollup.date: rollup.completed_count for rollup in rollups}
+        completed_deltas = {}
+        became_active = []
+        became_inactive = []
+        for date in dates:
+            old_count, new_count = before.get(date, 0), after.get(date, 0)
+            if old_count != new_count:
+                completed_deltas[date] = new_count - old_count
+                _track_activity(date, old_count, new_count, became_active, became_inactive)
+        if completed_deltas:
+            update_user_analytics(user_id, completed_deltas, became_active, became_inactive)
+    invalidate_user_stats_on_commit(user_id)
+    return len(rollups)
+
+
+def rebuild_rollups(user_ids, batch_size=1000):
+    """Перестроить все сводки набора пользователей. Возвращает число сводок"""
+    from habits.models import HabitLog
+
+    rollups = _aggregate_logs(HabitLog.objects.filter(user_id__in=user_ids))
+    with transaction.atomic():
+        DailyUserRollup.objects.filter(user_id__in=user_ids).delete()
+        DailyUserRollup.objects.bulk_create(rollups, batch_size=batch_size)
+    return len(rollups)
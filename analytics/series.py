@@ -0,0 +1,85 @@
+"""
+Плотный дневной ряд привычки: значение за каждый день диапазона без
+пропусков, скользящие средние за 7 и 30 дней и достижение цели.
+
+Ряд строится по одному запросу values_list в массивах array, без
+создания моделей, поэтому годится и для многолетних диапазонов.
+"""
+from array import array
+from datetime import timedelta
+
+ROLLING_WINDOWS = (7, 30)
+
+# Ограничение длины ряда (около 10 лет)
+MAX_SERIES_DAYS = 3660
+
+
+def daily_target(habit):
+    """Цель на день: target_value, если задано, иначе daily_target"""
+    if habit.target_value is not None:
+        return float(habit.target_value)
+    return float(habit.daily_target)
+
+
+def _rolling_average(prefix, window, offset, days):
+    """
+    Скользящее среднее по префиксным суммам ``prefix``.
+
+    Ряд в ``prefix`` начинается за ``offset`` дней до первого дня ответа,
+    так что окно в начале диапазона опирается на реальные данные.
+    """
+    averages = array('d', bytes(8 * days))
+    for day in range(days):
+        end = offset + day + 1
+        start = max(0, end - window)
+        averages[day] = (prefix[end] - prefix[start]) / window
+    return averages
+
+
+def habit_series(habit, start, end):
+    """Ряд привычки за [start, end] — словарь для ответа API"""
+    from habits.models import HabitLog
+
+    target = daily_target(habit)
+    offset = max(ROLLING_WINDOWS) - 1
+    first = start - timedelta(days=offset)
+    total_days = (end - first).days + 1
+    days = total_days - offset
+
+    amounts = array('d', bytes(8 * total_days))
+    attained = array('b', bytes(days))
+    completed = 0
+    rows = HabitLog.objects.filter(
+        habit=habit,
+        date__gte=first,
+        date__lte=end,
+    ).order_by().values_list('date', 'value', 'status')
+    for date, value, status in rows:
+        index = (date - first).days
+        if status == 'skipped':
+            continue
+        # Выполнение без значения считаем выполнением цели на день
+        amount = float(value) if value is not None else (target if status == 'completed' else 0.0)
+        amounts[index] = amount
+        if index >= offset:
+            attained[index - offset] = amount >= target
+            completed += status == 'completed'
+
+    prefix = array('d', bytes(8 * (total_days + 1)))
+    for index, amount in enumerate(amounts):
+        prefix[index + 1] = prefix[index] + amount
+
+    series = {
+        'from': start,
+        'to': end,
+        'target': target,
+        'values': [round(amount, 2) for amount in amounts[offset:]],
+        'attained': list(attained),
+        'completion_rate': round(completed / days * 100, 2),
+        'attainment_rate': round(sum(attained) / days * 100, 2),
+    }
+    for window in ROLLING_WINDOWS:
+        series[f'rolling_{window}'] = [
+            round(average, 2) for average in _rolling_average(prefix, window, offset, days)
+        ]
+    return series
@@ -0,0 +1,60 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from habits.models import Habit, HabitLog
+
+from .heatmap import invalidate_heatmaps
+from .rollups import apply_log_delta, log_state, refresh_rollups
+
+
+@receiver(post_save, sender=HabitLog)
+def habit_log_saved(sender, instance, created, raw=False, **kwargs):
+    """Обновить дневную сводку и сбросить тепловую карту после записи лога"""
+    if raw:
+        return
+    user_id = instance.user_id
+    old = None if created else getattr(instance, '_saved_state', None)
+    source = None if created else getattr(instance, '_saved_owner', None)
+    old_habit_id, old_user_id = source or (instance.habit_id, user_id)
+    if not created and old is None:
+        # Прежнее состояние лога неизвестно — пересчитываем день целиком
+        refresh_rollups(user_id, [instance.date])
+    elif old_user_id != user_id:
+        # Лог перенесли на привычку другого пользователя: у прежнего он удалён
+        apply_log_delta(old_user_id, old=old)
+        apply_log_delta(user_id, new=log_state(instance))
+    else:
+        apply_log_delta(user_id, old=old, new=log_state(instance))
+    changed = [(instance.habit_id, instance.date)]
+    if old is not None:
+        changed.append((old_habit_id, old[0]))
+    invalidate_heatmaps(changed)
+
+
+@receiver(post_delete, sender=HabitLog)
+def habit_log_deleted(sender, instance, origin=None, **kwargs):
+    """Обновить дневную сводку и сбросить тепловую карту после удаления лога"""
+    # Каскад от привычки обрабатывается целиком в habit_deleted,
+    # сводки удалённого пользователя удаляются каскадом
+    if origin is not None and getattr(origin, 'model', type(origin)) is not HabitLog:
+        return
+    old = getattr(instance, '_saved_state', log_state(instance))
+    apply_log_delta(instance.user_id, old=old)
+    invalidate_heatmaps([(instance.habit_id, old[0])])
+
+
+@receiver(pre_delete, sender=Habit)
+def habit_deleting(sender, instance, origin=None, **kwargs):
+    """Запомнить дни с логами привычки до их каскадного удаления"""
+    # Каскад от удаления пользователя (объектом или QuerySet'ом): сводки удалятся вместе с ним
+    if origin is not None and getattr(origin, 'model', type(origin)) is not Habit:
+        return
+    instance._rollup_dates = list(instance.logs.order_by().values_list('date', flat=True))
+
+
+@receiver(post_delete, sender=Habit)
+def habit_deleted(sender, instance, **kwargs):
+    """Пересчитать сводки за дни, в которые были логи удалённой привычки"""
+    dates = getattr(instance, '_rollup_dates', None)
+    if dates:
+        refresh_rollups(instance.user_id, dates)
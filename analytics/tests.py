@@ -1,3 +1,315 @@
+import base64
+import re
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from analytics.counters import ANALYTICS_FIELDS, compute_user_analytics
+from analytics.heatmap import RLE_SYMBOLS, STATUS_CODES
+from analytics.models import DailyUserRollup, UserAnalytics
+from analytics.rollups import rebuild_rollups
+from analytics.views import WEEKDAYS, user_today
+from habit_tracker.testing import QueryBudget, QueryBudgetMixin, first_habit
+from habits.models import Habit, HabitLog
+
+
+User = get_user_model()
+
+
+class WeeklyStatsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='a1', password='pass12345', timezone='Asia/Tokyo')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.habit = Habit.objects.create(user=self.user, name='h')
+        self.today = user_today(self.user)
+        self.url = reverse('weekly-stats')
+
+    def _log(self, days_ago, status='completed'):
+        HabitLog.objects.create(habit=self.habit, date=self.today - timedelta(days=days_ago), status=status)
+
+    def test_counts_only_completions_in_period(self):
+        self._log(0)
+        self._log(1, 'skipped')
+        self._log(2, 'partial')
+        self._log(7)
+        self._log(20)
+
+        with self.assertNumQueries(1):
+            data = self.client.get(self.url).json()
+        self.assertEqual(data['total_completions'], 1)
+        self.assertEqual(data['total_skips'], 1)
+        self.assertEqual(data['total_partial'], 1)
+        weekday = WEEKDAYS[(self.today.isoweekday() % 7) + 1]
+        self.assertEqual(data['weekly_stats'][weekday], 1)
+        self.assertEqual(sum(data['weekly_stats'].values()), 1)
+
+        data = self.client.get(self.url, {'period': 'month'}).json()
+        self.assertEqual(data['total_completions'], 3)
+        self.assertEqual(data['average_per_day'], 0.1)
+
+    def test_rejects_unknown_period(self):
+        resp = self.client.get(self.url, {'period': 'decade'})
+        self.assertEqual(resp.status_code, 400)
+
+
+class DailyUserRollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='a2', password='pass12345')
+        self.habits = [Habit.objects.create(user=self.user, name=f'h{i}') for i in range(3)]
+        self.today = user_today(self.user)
+
+    def _rollups(self):
+        return {
+            r.date: (r.completed_count, r.skipped_count, r.partial_count, r.value_sum)
+            for r in DailyUserRollup.objects.filter(user=self.user)
+            if r.completed_count or r.skipped_count or r.partial_count
+        }
+
+    def assertRollupsMatchRebuild(self):
+        incremental = self._rollups()
+        rebuild_rollups([self.user.pk])
+        self.assertEqual(incremental, self._rollups())
+
+        analytics = UserAnalytics.objects.filter(user=self.user).values(*ANALYTICS_FIELDS).first()
+        self.assertEqual(analytics, compute_user_analytics([self.user.pk])[self.user.pk])
+
+    def test_random_log_changes_match_rebuild(self):
+        import random
+
+        rng = random.Random(12)
+        logs = {}
+        for _ in range(200):
+            key = (rng.choice(self.habits), self.today - timedelta(days=rng.randrange(5)))
+            status = rng.choice(['completed', 'skipped', 'partial'])
+            value = Decimal(rng.randrange(5))
+            log = logs.get(key)
+            if log is None:
+                logs[key] = HabitLog.objects.create(habit=key[0], date=key[1], status=status, value=value)
+            elif rng.random() < 0.3:
+                HabitLog.objects.get(pk=log.pk).delete()
+                del logs[key]
+            else:
+                log = HabitLog.objects.get(pk=log.pk)
+                log.status = status
+                log.value = value
+                log.date = self.today - timedelta(days=rng.randrange(5))
+                if (log.habit, log.date) in logs and logs[(log.habit, log.date)].pk != log.pk:
+                    continue
+                log.save()
+                del logs[key]
+                logs[(log.habit, log.date)] = log
+        self.assertRollupsMatchRebuild()
+
+    def test_habit_delete_and_bulk_upsert_update_rollups(self):
+        HabitLog.objects.create(habit=self.habits[0], date=self.today, value=Decimal('2'))
+        HabitLog.objects.create(habit=self.habits[1], date=self.today)
+        self.habits[0].delete()
+        self.assertEqual(self._rollups(), {self.today: (1, 0, 0, Decimal('0'))})
+
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        ops = [{'habit_id': str(self.habits[2].id), 'date': self.today.isoformat(), 'status': 'skipped'}]
+        client.post(reverse('habit-logs-bulk'), ops, format='json')
+        self.assertEqual(self._rollups(), {self.today: (1, 1, 0, Decimal('0'))})
+        self.assertRollupsMatchRebuild()
+
+    def test_complete_endpoints_accept_float_and_string_values(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        # Форма: значение приходит строкой
+        resp = client.post(reverse('complete-habit', args=[self.habits[0].pk]), {'value': '3'})
+        self.assertEqual(resp.status_code, 200)
+        # JSON float поверх пропуска
+        HabitLog.objects.create(habit=self.habits[1], date=self.today, status='skipped')
+        resp = client.post(
+            reverse('complete-habit', args=[self.habits[1].pk]), {'value': 2.5}, format='json',
+        )
+        self.assertEqual(resp.status_code, 200)
+        HabitLog.objects.create(habit=self.habits[2], date=self.today, status='skipped')
+        resp = client.post(reverse('habit-complete', args=[self.habits[2].pk]), {'value': '1.5'})
+        self.assertEqual(resp.status_code, 200)
+
+        self.assertEqual(self._rollups(), {self.today: (3, 0, 0, Decimal('7'))})
+        self.assertRollupsMatchRebuild()
+
+    def test_deleting_users_through_queryset_skips_rollup_refresh(self):
+        HabitLog.objects.create(habit=self.habits[0], date=self.today)
+        with mock.patch('analytics.signals.refresh_rollups') as refresh:
+            User.objects.filter(pk=self.user.pk).delete()
+        refresh.assert_not_called()
+        self.assertFalse(DailyUserRollup.objects.filter(user_id=self.user.pk).exists())
+
+    def test_rebuild_command(self):
+        HabitLog.objects.create(habit=self.habits[0], date=self.today)
+        DailyUserRollup.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_daily_rollups', batch_size=1, stdout=out)
+        self.assertIn('Перестроено 1 сводок', out.getvalue())
+        self.assertEqual(self._rollups(), {self.today: (1, 0, 0, Decimal('0'))})
+
+
+class UserAnalyticsCountersTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='a3', password='pass12345')
+        self.habits = [Habit.objects.create(user=self.user, name=f'h{i}') for i in range(2)]
+        self.monday = user_today(self.user) - timedelta(days=user_today(self.user).weekday() + 7)
+
+    def test_counters_follow_log_writes(self):
+        first = HabitLog.objects.create(habit=self.habits[0], date=self.monday)
+        HabitLog.objects.create(habit=self.habits[1], date=self.monday)
+        HabitLog.objects.create(habit=self.habits[0], date=self.monday + timedelta(days=2), status='skipped')
+        last = HabitLog.objects.create(habit=self.habits[0], date=self.monday + timedelta(days=3))
+
+        analytics = UserAnalytics.objects.get(user=self.user)
+        self.assertEqual(analytics.monday_completions, 2)
+        self.assertEqual(analytics.wednesday_completions, 0)
+        self.assertEqual(analytics.thursday_completions, 1)
+        self.assertEqual(analytics.total_days_active, 2)
+        self.assertEqual(analytics.last_active_date, self.monday + timedelta(days=3))
+
+        last.delete()
+        first.status = 'skipped'
+        first.save()
+        analytics.refresh_from_db()
+        self.assertEqual(analytics.monday_completions, 1)
+        self.assertEqual(analytics.thursday_completions, 0)
+        self.assertEqual(analytics.total_days_active, 1)
+        self.assertEqual(analytics.last_active_date, self.monday)
+
+    def test_backfill_command_and_endpoint(self):
+        HabitLog.objects.create(habit=self.habits[0], date=self.monday)
+        UserAnalytics.objects.all().delete()
+
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        data = client.get(reverse('user-analytics')).json()
+        self.assertEqual((data['monday_completions'], data['total_days_active']), (1, 1))
+
+        UserAnalytics.objects.update(monday_completions=0, total_days_active=0)
+        out = StringIO()
+        call_command('backfill_user_analytics', stdout=out)
+        self.assertIn('Аналитика пересчитана для 1 пользователей', out.getvalue())
+        analytics = UserAnalytics.objects.get(user=self.user)
+        self.assertEqual((analytics.monday_completions, analytics.total_days_active), (1, 1))
+
+
+class HeatmapTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='a4', password='pass12345')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.habits = [Habit.objects.create(user=self.user, name=f'h{i}') for i in range(2)]
+        self.url = reverse('heatmap')
+
+    def _decode(self, heatmap, days):
+        if heatmap['encoding'] == 'rle':
+            codes = []
+            for count, symbol in re.findall(r'(\d*)(.)', heatmap['data']):
+                codes += [RLE_SYMBOLS.index(symbol)] * int(count or 1)
+        else:
+            packed = base64.b64decode(heatmap['data'])
+            codes = [(packed[i // 4] >> (6 - 2 * (i % 4))) & 3 for i in range(len(packed) * 4)]
+        return (codes + [0] * days)[:days]
+
+    def test_encodes_year_and_picks_shorter_form(self):
+        import random
+
+        rng = random.Random(3)
+        start = date(2024, 1, 1)
+        expected = []
+        logs = []
+        for offset in range(366):
+            status = rng.choice([None, 'completed', 'partial', 'skipped'])
+            expected.append(STATUS_CODES[status])
+            if status:
+                logs.append(HabitLog(habit=self.habits[0], date=start + timedelta(days=offset), status=status))
+        logs += [HabitLog(habit=self.habits[1], date=start + timedelta(days=d)) for d in range(10, 40)]
+        HabitLog.objects.bulk_create(logs)
+
+        with self.assertNumQueries(2):
+            data = self.client.get(self.url, {'year': 2024}).json()
+        first, second = data['habits']
+        self.assertEqual(first['encoding'], 'bitmap')
+        self.assertLessEqual(len(first['data']), 124)
+        self.assertEqual(self._decode(first, 366), expected)
+        self.assertEqual(second, {'habit_id': str(self.habits[1].id), 'encoding': 'rle', 'data': '10-30c'})
+
+        # Повторный запрос — из кэша
+        with self.assertNumQueries(1):
+            self.client.get(self.url, {'year': 2024})
+
+    def test_log_write_invalidates_cached_year(self):
+        params = {'habit': str(self.habits[0].id), 'year': 2024}
+        self.assertEqual(self.client.get(self.url, params).json()['habits'][0]['data'], '')
+        log = HabitLog.objects.create(habit=self.habits[0], date=date(2024, 1, 2), status='skipped')
+        self.assertEqual(self.client.get(self.url, params).json()['habits'][0]['data'], '-s')
+        log.delete()
+        self.assertEqual(self.client.get(self.url, params).json()['habits'][0]['data'], '')
+
+    def test_rejects_foreign_habit_and_bad_year(self):
+        other = User.objects.create_user(username='a5', password='pass12345')
+        foreign = Habit.objects.create(user=other, name='foreign')
+        self.assertEqual(self.client.get(self.url, {'habit': str(foreign.id)}).status_code, 404)
+        self.assertEqual(self.client.get(self.url, {'habit': 'nope'}).status_code, 404)
+        self.assertEqual(self.client.get(self.url, {'year': 'x'}).status_code, 400)
+
+
+class HabitSeriesTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='a6', password='pass12345')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.habit = Habit.objects.create(user=self.user, name='run', target_value=Decimal('5'))
+        self.start = date(2024, 3, 1)
+
+    def _log(self, offset, status='completed', value=None):
+        HabitLog.objects.create(habit=self.habit, date=self.start + timedelta(days=offset), status=status, value=value)
+
+    def test_dense_series_with_rolling_averages(self):
+        self._log(-1, value=Decimal('7'))
+        self._log(0, value=Decimal('5'))
+        self._log(2, 'partial', Decimal('2'))
+        self._log(3)
+        self._log(4, 'skipped', Decimal('9'))
+
+        url = reverse('habit-series', kwargs={'habit_id': self.habit.id})
+        with self.assertNumQueries(2):
+            data = self.client.get(url, {'from': '2024-03-01', 'to': '2024-03-07'}).json()
+        self.assertEqual(data['values'], [5, 0, 2, 5, 0, 0, 0])
+        self.assertEqual(data['attained'], [1, 0, 0, 1, 0, 0, 0])
+        # Окно 7 дней на 1 марта включает 29 февраля
+        self.assertEqual(data['rolling_7'], [1.71, 1.71, 2.0, 2.71, 2.71, 2.71, 1.71])
+        self.assertEqual(data['rolling_30'][-1], 0.63)
+        self.assertEqual(data['completion_rate'], 28.57)
+        self.assertEqual(data['attainment_rate'], 28.57)
+
+        self.assertEqual(self.client.get(url, {'from': '2024-03-08', 'to': '2024-03-01'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'from': '2000-01-01', 'to': '2024-03-01'}).status_code, 400)
+
+    def test_progress_counts_only_completed_days(self):
+        today = user_today(self.user)
+        HabitLog.objects.create(habit=self.habit, date=today, status='completed')
+        HabitLog.objects.create(habit=self.habit, date=today - timedelta(days=1), status='skipped')
+        url = reverse('habit-progress', kwargs={'habit_id': self.habit.id})
+        data = self.client.get(url).json()
+        self.assertEqual(len(data['daily_progress']), 2)
+        self.assertEqual(data['completion_rate'], 3.33)
+
 
-# Create your tests here.
+class AnalyticsQueryBudgetTests(QueryBudgetMixin, TestCase):
+    query_budgets = [
+        QueryBudget('user-analytics', 1),
+        QueryBudget('weekly-stats', 1),
+        QueryBudget('weekly-stats', 1, query_string='?period=year'),
+        QueryBudget('heatmap', 2),
+        QueryBudget('habit-progress', 2, url_args=first_habit),
+        QueryBudget('habit-series', 2, url_args=first_habit),
+    ]
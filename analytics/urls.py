@@ -4,5 +4,7 @@ from . import views
 urlpatterns = [
     path('', views.UserAnalyticsView.as_view(), name='user-analytics'),
     path('weekly/', views.weekly_stats, name='weekly-stats'),
+    path('heatmap/', views.heatmap, name='heatmap'),
     path('habits/<uuid:habit_id>/progress/', views.habit_progress, name='habit-progress'),
+    path('habits/<uuid:habit_id>/series/', views.habit_series, name='habit-series'),
 ]
@@ -1,80 +1,179 @@
 from django.shortcuts import render
-from rest_framework import generics, permissions
+from rest_framework import generics, permissions, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
+from django.core.exceptions import ValidationError
+from django.db.models import Sum
+from django.db.models.functions import ExtractWeekDay
 from django.utils import timezone
-from datetime import timedelta
-from .models import UserAnalytics
+from datetime import date, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from .counters import store_user_analytics
+from .heatmap import year_heatmaps
+from . import series
+from .models import DailyUserRollup, UserAnalytics
 from .serializers import UserAnalyticsSerializer
 from habits.models import HabitLog
 
 # Create your views here.
 
+# Длина периода статистики в днях
+PERIOD_DAYS = {
+    'week': 7,
+    'month': 30,
+    'year': 365,
+}
+
+# Номер дня недели в ExtractWeekDay (1 — воскресенье) -> ключ ответа
+WEEKDAYS = {
+    2: 'monday',
+    3: 'tuesday',
+    4: 'wednesday',
+    5: 'thursday',
+    6: 'friday',
+    7: 'saturday',
+    1: 'sunday',
+}
+
+
+def user_today(user):
+    """Сегодняшняя дата в часовом поясе пользователя"""
+    try:
+        tz = ZoneInfo(user.timezone)
+    except (ZoneInfoNotFoundError, ValueError):
+        tz = timezone.get_default_timezone()
+    return timezone.localdate(timezone=tz)
+
+
 class UserAnalyticsView(generics.RetrieveAPIView):
     """Аналитика пользователя"""
     serializer_class = UserAnalyticsSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
-        analytics, created = UserAnalytics.objects.get_or_create(user=self.request.user)
-        return analytics
+        user = self.request.user
+        try:
+            return UserAnalytics.objects.get(user=user)
+        except UserAnalytics.DoesNotExist:
+            # Счётчики поддерживаются при записи логов; если записи ещё нет —
+            # считаем её один раз по логам
+            store_user_analytics([user.pk])
+            return UserAnalytics.objects.get(user=user)
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def weekly_stats(request):
-    """Недельная статистика"""
-    user = request.user
-    today = timezone.now().date()
-    week_ago = today - timedelta(days=7)
-    
-    # Получаем логи за последнюю неделю
-    logs = HabitLog.objects.filter(
-        habit__user=user,
-        date__gte=week_ago,
-        date__lte=today
+    """
+    Статистика выполнений по дням недели за период.
+
+    ?period=week|month|year — последние 7/30/365 дней, включая сегодняшний
+    день в часовом поясе пользователя. Все показатели считаются одним
+    сгруппированным запросом по дневным сводкам.
+    """
+    period = request.query_params.get('period', 'week')
+    if period not in PERIOD_DAYS:
+        return Response(
+            {'error': f"Неверный период, допустимо: {', '.join(PERIOD_DAYS)}"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    days = PERIOD_DAYS[period]
+    today = user_today(request.user)
+    start = today - timedelta(days=days - 1)
+
+    # Не более 365 строк дневных сводок вместо скана логов
+    rows = DailyUserRollup.objects.filter(
+        user=request.user,
+        date__gte=start,
+        date__lte=today,
+    ).order_by().values(weekday=ExtractWeekDay('date')).annotate(
+        completed=Sum('completed_count'),
+        skipped=Sum('skipped_count'),
+        partial=Sum('partial_count'),
     )
-    
-    # Группируем по дням недели
-    stats = {
-        'monday': logs.filter(date__week_day=2).count(),
-        'tuesday': logs.filter(date__week_day=3).count(),
-        'wednesday': logs.filter(date__week_day=4).count(),
-        'thursday': logs.filter(date__week_day=5).count(),
-        'friday': logs.filter(date__week_day=6).count(),
-        'saturday': logs.filter(date__week_day=7).count(),
-        'sunday': logs.filter(date__week_day=1).count(),
-    }
-    
+
+    stats = dict.fromkeys(WEEKDAYS.values(), 0)
+    totals = {'completed': 0, 'skipped': 0, 'partial': 0}
+    for row in rows:
+        stats[WEEKDAYS[row['weekday']]] = row['completed']
+        for key in totals:
+            totals[key] += row[key]
+
     return Response({
+        'period': period,
+        'from': start,
+        'to': today,
         'weekly_stats': stats,
-        'total_completions': logs.count(),
-        'average_per_day': round(logs.count() / 7, 2)
+        'total_completions': totals['completed'],
+        'total_skips': totals['skipped'],
+        'total_partial': totals['partial'],
+        'average_per_day': round(totals['completed'] / days, 2),
+    })
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def heatmap(request):
+    """
+    Годовая тепловая карта: статус каждого дня в 2 битах (см. analytics.heatmap).
+
+    ?year= — год (по умолчанию текущий), ?habit= — одна привычка,
+    без него — все привычки пользователя.
+    """
+    from habits.models import Habit
+
+    year = request.query_params.get('year')
+    if year is None:
+        year = user_today(request.user).year
+    else:
+        try:
+            year = int(year)
+        except ValueError:
+            return Response({'error': 'Неверный год'}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= year <= 9998:
+            return Response({'error': 'Неверный год'}, status=status.HTTP_400_BAD_REQUEST)
+
+    habits = Habit.objects.filter(user=request.user)
+    habit_id = request.query_params.get('habit')
+    if habit_id:
+        try:
+            habits = habits.filter(id=habit_id)
+            habit_ids = list(habits.values_list('id', flat=True))
+        except ValidationError:
+            habit_ids = []
+        if not habit_ids:
+            return Response({'error': 'Привычка не найдена'}, status=status.HTTP_404_NOT_FOUND)
+    else:
+        habit_ids = list(habits.values_list('id', flat=True))
+
+    heatmaps = year_heatmaps(habit_ids, year)
+    return Response({
+        'year': year,
+        'habits': [{'habit_id': habit_id, **heatmaps[habit_id]} for habit_id in habit_ids],
     })
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def habit_progress(request, habit_id):
-    """Прогресс конкретной привычки"""
+    """Прогресс конкретной привычки за последние 30 дней"""
     from habits.models import Habit
     
     try:
         habit = Habit.objects.get(id=habit_id, user=request.user)
         
-        # Получаем логи за последние 30 дней
-        thirty_days_ago = timezone.now().date() - timedelta(days=30)
+        today = user_today(request.user)
+        thirty_days_ago = today - timedelta(days=29)
         logs = HabitLog.objects.filter(
             habit=habit,
-            date__gte=thirty_days_ago
-        ).order_by('date')
+            date__gte=thirty_days_ago,
+            date__lte=today,
+        ).order_by('date').values_list('date', 'value', 'status')
         
-        # Группируем по дням
+        # Один лог на день (unique_together), значения без агрегации
         daily_progress = {}
-        for log in logs:
-            date = log.date.isoformat()
-            if date in daily_progress:
-                daily_progress[date] += log.value or 0
-            else:
-                daily_progress[date] = log.value or 0
+        completed_days = 0
+        for day, value, log_status in logs:
+            daily_progress[day.isoformat()] = value or 0
+            completed_days += log_status == 'completed'
         
         return Response({
             'habit_name': habit.name,
@@ -82,7 +181,40 @@ def habit_progress(request, habit_id):
             'longest_streak': habit.longest_streak,
             'total_completions': habit.total_completions,
             'daily_progress': daily_progress,
-            'completion_rate': round((len(daily_progress) / 30) * 100, 2)
+            'completion_rate': round((completed_days / 30) * 100, 2)
         })
     except Habit.DoesNotExist:
         return Response({'error': 'Привычка не найдена'}, status=404)
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def habit_series(request, habit_id):
+    """
+    Плотный дневной ряд привычки за ?from=&to= (YYYY-MM-DD).
+
+    По умолчанию — последние 30 дней. Пропущенные дни заполнены нулями,
+    добавлены скользящие средние за 7 и 30 дней и достижение цели по дням.
+    """
+    from habits.models import Habit
+
+    try:
+        habit = Habit.objects.get(id=habit_id, user=request.user)
+    except Habit.DoesNotExist:
+        return Response({'error': 'Привычка не найдена'}, status=status.HTTP_404_NOT_FOUND)
+
+    try:
+        end = request.query_params.get('to')
+        end = date.fromisoformat(end) if end else user_today(request.user)
+        start = request.query_params.get('from')
+        start = date.fromisoformat(start) if start else end - timedelta(days=29)
+    except ValueError:
+        return Response({'error': 'Неверный формат даты'}, status=status.HTTP_400_BAD_REQUEST)
+    if start > end:
+        return Response({'error': 'from должен быть не позже to'}, status=status.HTTP_400_BAD_REQUEST)
+    if (end - start).days >= series.MAX_SERIES_DAYS:
+        return Response(
+            {'error': f'Диапазон не должен превышать {series.MAX_SERIES_DAYS} дней'},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    return Response({'habit_id': habit.id, **series.habit_series(habit, start, end)})
@@ -0,0 +1,103 @@
+"""
+Генерация UUIDv7 (RFC 9562) для первичных ключей.
+
+Раскладка 128 бит:
+
+    unix_ts_ms (48) | ver=7 (4) | rand_a (12) | var=0b10 (2) | rand_b (62)
+
+rand_a используется как счётчик внутри миллисекунды (RFC 9562, 6.2,
+метод 1): в начале миллисекунды он получает случайное значение не больше
+0x7FF и растёт на каждом id. Поэтому id строго возрастают и в пределах
+процесса, и при нескольких потоках, а новые строки ложатся в конец
+индекса первичного ключа. При переполнении счётчика или переводе часов
+назад время берётся на 1 мс больше последнего выданного.
+
+Случайные биты берутся из os.urandom блоками (_POOL_SIZE байт); после
+fork пул сбрасывается, чтобы процессы не выдавали одинаковые id.
+"""
+import os
+import threading
+import time
+import uuid
+
+_VERSION_VARIANT = (0x7 << 76) | (0b10 << 62)
+_RAND_B_BITS = 62
+_RAND_B_MASK = (1 << _RAND_B_BITS) - 1
+_COUNTER_MAX = 0xFFF
+_COUNTER_SEED_BITS = 11
+# Случайных бит на id: rand_b и отдельно затравка счётчика
+_DRAW_BITS = _RAND_B_BITS + _COUNTER_SEED_BITS
+_DRAW_MASK = (1 << _DRAW_BITS) - 1
+_POOL_SIZE = 512
+
+_clock = time.time_ns
+_lock = threading.Lock()
+_last_ms = 0
+_counter = 0
+_pool = 0
+_pool_pos = 0
+
+
+def _reset_pool():
+    global _pool, _pool_pos
+    _pool = 0
+    _pool_pos = 0
+
+
+os.register_at_fork(after_in_child=_reset_pool)
+
+
+def _refill():
+    """Новый блок случайных байт как одно большое целое (вызывать под _lock)"""
+    global _pool, _pool_pos
+    _pool = int.from_bytes(os.urandom(_POOL_SIZE), 'big')
+    _pool_pos = _POOL_SIZE * 8
+
+
+def _next_int():
+    """Следующий id как целое (вызывать под _lock)"""
+    global _last_ms, _counter, _pool_pos
+    if _pool_pos < _DRAW_BITS:
+        _refill()
+    # Один сдвиг на id: младшие 62 бита — rand_b, старшие 11 — затравка
+    # счётчика; биты не пересекаются
+    _pool_pos -= _DRAW_BITS
+    bits = (_pool >> _pool_pos) & _DRAW_MASK
+    now_ms = _clock() // 1_000_000
+    if now_ms > _last_ms:
+        _last_ms = now_ms
+        _counter = bits >> _RAND_B_BITS
+    else:
+        _counter += 1
+        if _counter > _COUNTER_MAX:
+            _last_ms += 1
+            _counter = 0
+    return (_last_ms << 80) | (_counter << 64) | _VERSION_VARIANT | (bits & _RAND_B_MASK)
+
+
+_new = object.__new__
+_setattr = object.__setattr__
+_UUID = uuid.UUID
+_SAFE_UNKNOWN = uuid.SafeUUID.unknown
+
+
+def _from_int(value):
+    """UUID из готового 128-битного значения без проверок конструктора"""
+    result = _new(_UUID)
+    _setattr(result, 'int', value)
+    _setattr(result, 'is_safe', _SAFE_UNKNOWN)
+    return result
+
+
+def uuid7():
+    """Один монотонно возрастающий UUIDv7"""
+    with _lock:
+        value = _next_int()
+    return _from_int(value)
+
+
+def uuid7_batch(count):
+    """``count`` возрастающих UUIDv7 для массовой вставки (одна блокировка)"""
+    with _lock:
+        values = [_next_int() for _ in range(count)]
+    return [_from_int(value) for value in values]
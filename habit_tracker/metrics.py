@@ -0,0 +1,193 @@
+"""
+Метрики запросов: число SQL-запросов, время БД, сериализации и view.
+
+RequestMetricsMiddleware включается настройкой REQUEST_METRICS_ENABLED.
+Выключенный, он выбрасывает MiddlewareNotUsed при загрузке и не стоит
+ничего. Включённый, он:
+
+- отдаёт метрики в заголовке Server-Timing (видно в DevTools браузера);
+- пишет в лог habit_tracker.metrics JSON-строку для запросов дольше
+  REQUEST_METRICS_SLOW_MS;
+- копит гистограмму времени по имени URL. Она живёт в памяти процесса
+  (у каждого воркера своя) и доступна staff-пользователям через
+  /api/metrics/requests/.
+
+Время сериализации — суммарное время свойства ``.data`` сериализаторов DRF
+верхнего уровня; для этого BaseSerializer.data оборачивается один раз при
+включении метрик.
+"""
+import contextvars
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+# Верхние границы корзин гистограммы, мс; последняя корзина — всё, что дольше
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500)
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestRecord:
+    """Метрики одного запроса"""
+    __slots__ = ('queries', 'db_ms', 'serializer_ms', 'serializer_depth')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_ms = 0.0
+        self.serializer_ms = 0.0
+        self.serializer_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        """connection.execute_wrapper: считаем запросы и их время"""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_ms += (time.perf_counter() - started) * 1000
+            self.queries += 1
+
+
+class RequestHistogram:
+    """Гистограмма времени ответа и сумма метрик по имени URL (потокобезопасна)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, name, total_ms, record):
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = {
+                    'count': 0,
+                    'buckets': [0] * (len(LATENCY_BUCKETS_MS) + 1),
+                    'total_ms': 0.0,
+                    'max_ms': 0.0,
+                    'queries': 0,
+                    'max_queries': 0,
+                    'db_ms': 0.0,
+                    'serializer_ms': 0.0,
+                }
+            stats['count'] += 1
+            stats['buckets'][_bucket(total_ms)] += 1
+            stats['total_ms'] += total_ms
+            stats['max_ms'] = max(stats['max_ms'], total_ms)
+            stats['queries'] += record.queries
+            stats['max_queries'] = max(stats['max_queries'], record.queries)
+            stats['db_ms'] += record.db_ms
+            stats['serializer_ms'] += record.serializer_ms
+
+    def snapshot(self):
+        """Копия статистики со средними; корзины подписаны верхней границей"""
+        labels = [f'<={bound}ms' for bound in LATENCY_BUCKETS_MS] + [f'>{LATENCY_BUCKETS_MS[-1]}ms']
+        with self._lock:
+            stats = {name: dict(values) for name, values in self._stats.items()}
+        result = {}
+        for name, values in sorted(stats.items()):
+            count = values['count']
+            result[name] = {
+                'count': count,
+                'latency_buckets': dict(zip(labels, values['buckets'])),
+                'mean_ms': round(values['total_ms'] / count, 2),
+                'max_ms': round(values['max_ms'], 2),
+                'mean_queries': round(values['queries'] / count, 2),
+                'max_queries': values['max_queries'],
+                'mean_db_ms': round(values['db_ms'] / count, 2),
+                'mean_serializer_ms': round(values['serializer_ms'] / count, 2),
+            }
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+request_histogram = RequestHistogram()
+
+
+def _bucket(total_ms):
+    for index, bound in enumerate(LATENCY_BUCKETS_MS):
+        if total_ms <= bound:
+            return index
+    return len(LATENCY_BUCKETS_MS)
+
+
+def _install_serializer_timing():
+    """Обернуть BaseSerializer.data: время сериализации идёт в метрики запроса"""
+    from rest_framework.serializers import BaseSerializer
+
+    original = BaseSerializer.data
+    if getattr(original.fget, 'request_metrics', False):
+        return
+
+    def data(self):
+        record = _current.get()
+        # Вложенные сериализаторы уже учтены во внешнем
+        if record is None or record.serializer_depth:
+            return original.fget(self)
+        record.serializer_depth += 1
+        started = time.perf_counter()
+        try:
+            return original.fget(self)
+        finally:
+            record.serializer_depth -= 1
+            record.serializer_ms += (time.perf_counter() - started) * 1000
+
+    data.request_metrics = True
+    BaseSerializer.data = property(data, doc=original.__doc__)
+
+
+class RequestMetricsMiddleware:
+    """
+    Метрики запроса в Server-Timing, лог медленных запросов и гистограмма.
+
+    Стоит последним в MIDDLEWARE: время view — это время внутри
+    get_response, то есть разрешение URL, view и рендеринг ответа.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_METRICS_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_ms = settings.REQUEST_METRICS_SLOW_MS
+        _install_serializer_timing()
+
+    def __call__(self, request):
+        record = RequestRecord()
+        token = _current.set(record)
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(record):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        view_ms = (time.perf_counter() - started) * 1000
+
+        match = request.resolver_match
+        name = match.view_name if match and match.view_name else '<unresolved>'
+        request_histogram.record(name, view_ms, record)
+
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={record.db_ms:.2f};desc="{record.queries} queries"',
+            f'serializer;dur={record.serializer_ms:.2f}',
+            f'view;dur={view_ms:.2f}',
+        ])
+        if view_ms >= self.slow_ms:
+            logger.warning('slow request %s', json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'url_name': name,
+                'status': response.status_code,
+                'view_ms': round(view_ms, 2),
+                'db_ms': round(record.db_ms, 2),
+                'queries': record.queries,
+                'serializer_ms': round(record.serializer_ms, 2),
+            }, ensure_ascii=False))
+        return response
@@ -74,6 +74,9 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Последним: время view не включает остальные middleware.
+    # Выключен по умолчанию (REQUEST_METRICS_ENABLED) и тогда не загружается
+    'habit_tracker.metrics.RequestMetricsMiddleware',
 ]
 
 ROOT_URLCONF = 'habit_tracker.urls'
@@ -107,6 +110,20 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# LocMemCache живёт внутри процесса; при нескольких воркерах нужен общий
+# кэш (например, django.core.cache.backends.redis.RedisCache), иначе
+# сброс кэша в одном процессе не увидят остальные.
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='habit-tracker'),
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -160,6 +177,34 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 20,
 }
 
+# Вложенные логи в ответах /api/habits/: окно по умолчанию (?logs=recent)
+HABIT_LOGS_RECENT_DAYS = config('HABIT_LOGS_RECENT_DAYS', default=180, cast=int)
+
+# Максимум операций в одном запросе POST /api/habits/logs/bulk/
+HABIT_LOGS_BULK_LIMIT = config('HABIT_LOGS_BULK_LIMIT', default=1000, cast=int)
+
+# Сверять инкрементальную статистику привычек с полным пересчётом (отладка)
+HABIT_STATS_VERIFY = config('HABIT_STATS_VERIFY', default=False, cast=bool)
+
+# Время жизни кэша статистики пользователя (сбрасывается при записи логов)
+USER_STATS_CACHE_TIMEOUT = config('USER_STATS_CACHE_TIMEOUT', default=24 * 60 * 60, cast=int)
+
+# Интервал отложенного пересчёта статистики пользователя после записи логов, сек.
+# 0 — пересчитывать синхронно внутри запроса
+USER_STATS_DEBOUNCE_SECONDS = config('USER_STATS_DEBOUNCE_SECONDS', default=2.0, cast=float)
+
+# Время жизни кэша годовой тепловой карты привычки (сбрасывается при записи логов)
+HEATMAP_CACHE_TIMEOUT = config('HEATMAP_CACHE_TIMEOUT', default=7 * 24 * 60 * 60, cast=int)
+
+# Максимальное время жизни кэша уровня подписки; для платной подписки
+# кэш истекает не позже её end_date
+ENTITLEMENT_CACHE_TIMEOUT = config('ENTITLEMENT_CACHE_TIMEOUT', default=60 * 60, cast=int)
+
+# Метрики запросов: Server-Timing, лог медленных запросов, гистограмма по URL
+REQUEST_METRICS_ENABLED = config('REQUEST_METRICS_ENABLED', default=False, cast=bool)
+# Запросы дольше этого порога (мс) пишутся в лог habit_tracker.metrics
+REQUEST_METRICS_SLOW_MS = config('REQUEST_METRICS_SLOW_MS', default=500, cast=float)
+
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = config('CORS_ALLOW_ALL_ORIGINS', default=DEBUG, cast=bool)  # Только для разработки!
 CORS_ALLOW_CREDENTIALS = config('CORS_ALLOW_CREDENTIALS', default=True, cast=bool)
@@ -224,22 +269,6 @@ SIMPLE_JWT = {
 }
 
 # UUID7 Settings
-import uuid
-
-def uuid7():
-    """Generate UUID7 (timestamp-based UUID)"""
-    import time
-    import random
-    
-    # Get current timestamp in milliseconds since Unix epoch
-    timestamp_ms = int(time.time() * 1000)
-    
-    # Convert to UUID7 format (48 bits timestamp + 74 bits random)
-    timestamp_bytes = timestamp_ms.to_bytes(6, 'big')
-    random_bytes = random.getrandbits(74).to_bytes(10, 'big')
-    
-    # Combine timestamp and random bytes
-    uuid_bytes = timestamp_bytes + random_bytes
-    
-    # Create UUID object
-    return uuid.UUID(bytes=uuid_bytes)
+# Генератор живёт в habit_tracker.ids; импорт здесь сохраняет путь
+# habit_tracker.settings.uuid7, на который ссылаются модели и миграции
+from .ids import uuid7  # noqa: E402,F401
@@ -0,0 +1,137 @@
+"""
+Бюджет SQL-запросов на эндпоинт для тестов.
+
+Тестовый класс перечисляет эндпоинты в ``query_budgets`` с максимумом
+запросов для каждого. QueryBudgetMixin делает запрос к каждому эндпоинту
+на данных размера 1, 10 и 100: столько привычек, ещё столько архивных и
+столько логов у каждой. Он проверяет, что бюджет не превышен и что число
+запросов не растёт вместе с данными. Так N+1 (запрос на привычку или на
+лог) роняет тесты сразу.
+
+Запросы считаются с холодным кэшем и без учёта аутентификации
+(force_authenticate). Изменения данных после каждого запроса откатываются.
+"""
+from datetime import timedelta
+from types import SimpleNamespace
+from typing import Callable, NamedTuple, Optional
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+# Внутри тестовой транзакции atomic() превращается в SAVEPOINT — это не запросы
+TRANSACTION_STATEMENTS = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+
+class QueryBudget(NamedTuple):
+    """Эндпоинт и допустимое число запросов к БД"""
+    url_name: str
+    max_queries: int
+    method: str = 'get'
+    # fixture -> позиционные аргументы reverse()
+    url_args: Optional[Callable] = None
+    # fixture -> тело запроса (JSON)
+    data: Optional[Callable] = None
+    query_string: str = ''
+
+
+def first_habit(fixture):
+    return [fixture.habits[0].pk]
+
+
+def build_fixture(size, username):
+    """
+    Пользователь с ``size`` привычками в группах, ещё ``size`` архивными
+    и ``size`` днями логов у каждой привычки.
+    """
+    from habits.models import Habit, HabitGroup, HabitLog
+    from habits.seeding import refresh_user_aggregates
+
+    user = get_user_model().objects.create_user(username=username, password=None)
+    groups = [HabitGroup.objects.create(user=user, name=f'g{i}') for i in range(min(size, 2))]
+    habits = [
+        Habit.objects.create(user=user, group=groups[i % len(groups)], name=f'h{i}')
+        for i in range(size)
+    ]
+    archived = [
+        Habit.objects.create(
+            user=user, group=groups[i % len(groups)], name=f'a{i}',
+            is_archived=True, archived_at=timezone.now(),
+        )
+        for i in range(size)
+    ]
+    today = timezone.localdate()
+    HabitLog.objects.bulk_create([
+        HabitLog(
+            habit=habit,
+            date=today - timedelta(days=day),
+            status='skipped' if day % 5 == 4 else 'completed',
+            value=1,
+        )
+        for habit in habits + archived
+        for day in range(size)
+    ])
+    # bulk_create не вызывает сигналы — статистику и сводки считаем явно
+    refresh_user_aggregates(user.pk, [habit.pk for habit in habits + archived], today)
+    user.refresh_from_db()
+    return SimpleNamespace(user=user, groups=groups, habits=habits, archived=archived, today=today)
+
+
+class QueryBudgetMixin:
+    """Подмешивается к TestCase; эндпоинты задаются в query_budgets"""
+
+    fixture_sizes = (1, 10, 100)
+    query_budgets = ()
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.budget_fixtures = {
+            size: build_fixture(size, f'{cls.__name__.lower()}{size}') for size in cls.fixture_sizes
+        }
+
+    def count_queries(self, budget, fixture):
+        """Число запросов одного обращения к эндпоинту; изменения откатываются"""
+        client = APIClient()
+        client.force_authenticate(user=fixture.user)
+        args = budget.url_args(fixture) if budget.url_args else []
+        url = reverse(budget.url_name, args=args) + budget.query_string
+        data = budget.data(fixture) if budget.data else None
+
+        cache.clear()
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as ctx:
+                response = getattr(client, budget.method)(url, data, format='json')
+            transaction.set_rollback(True)
+        cache.clear()
+
+        self.assertLess(
+            response.status_code, 400,
+            f'{budget.method.upper()} {url}: {response.status_code} {getattr(response, "data", "")}',
+        )
+        return sum(
+            not query['sql'].startswith(TRANSACTION_STATEMENTS) for query in ctx.captured_queries
+        )
+
+    def test_query_budgets(self):
+        for budget in self.query_budgets:
+            with self.subTest(endpoint=budget.url_name, method=budget.method):
+                counts = {
+                    size: self.count_queries(budget, fixture)
+                    for size, fixture in self.budget_fixtures.items()
+                }
+                smallest = counts[min(counts)]
+                for size, count in counts.items():
+                    self.assertLessEqual(
+                        count, budget.max_queries,
+                        f'{budget.url_name}: {count} запросов на данных размера {size}, '
+                        f'бюджет {budget.max_queries}',
+                    )
+                    self.assertLessEqual(
+                        count, smallest,
+                        f'{budget.url_name}: число запросов растёт с данными {counts}',
+                    )
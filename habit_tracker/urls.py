@@ -20,6 +20,8 @@ from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
 )
+from habits.views import sync_changes
+from .views import request_metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -29,4 +31,6 @@ urlpatterns = [
     path('api/habits/', include('habits.urls')),
     path('api/analytics/', include('analytics.urls')),
     path('api/payments/', include('payments.urls')),
+    path('api/sync/', sync_changes, name='sync'),
+    path('api/metrics/requests/', request_metrics, name='request-metrics'),
 ]
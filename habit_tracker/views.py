@@ -0,0 +1,23 @@
+from rest_framework import permissions, status
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.response import Response
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .metrics import request_histogram
+
+
+@api_view(['GET', 'DELETE'])
+@authentication_classes([JWTAuthentication, SessionAuthentication])
+@permission_classes([permissions.IsAdminUser])
+def request_metrics(request):
+    """
+    Гистограмма запросов по имени URL этого процесса (только для staff).
+
+    Сессия админки тоже подходит: страницу можно открыть из /admin/.
+    DELETE — сбросить накопленную статистику.
+    """
+    if request.method == 'DELETE':
+        request_histogram.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    return Response({'requests': request_histogram.snapshot()})
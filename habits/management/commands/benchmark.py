@@ -0,0 +1,288 @@
+import json
+import platform
+import random
+import statistics
+import subprocess
+import time
+import tracemalloc
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from habits.models import Habit, HabitLog
+from habits.seeding import SYNTHETIC_USERNAME
+from users.stats import invalidate_user_stats
+
+# Управляющие транзакцией команды не считаются запросами: замеры идут
+# внутри откатываемой транзакции, где atomic() становится SAVEPOINT
+TRANSACTION_STATEMENTS = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE SAVEPOINT')
+
+
+def habits_list(rng, user, habit_ids):
+    return 'get', reverse('habit-list'), None
+
+
+def habit_complete(rng, user, habit_ids):
+    day = timezone.localdate() - timedelta(days=rng.randrange(30))
+    url = reverse('complete-habit', args=[rng.choice(habit_ids)])
+    return 'post', url, {'date': day.isoformat()}
+
+
+def user_stats(rng, user, habit_ids):
+    return 'get', reverse('user-stats'), None
+
+
+def weekly_stats(rng, user, habit_ids):
+    return 'get', reverse('weekly-stats'), None
+
+
+# Имя в отчёте -> построитель запроса (метод, url, тело)
+ENDPOINTS = {
+    'habits_list': habits_list,
+    'habit_complete': habit_complete,
+    'user_stats': user_stats,
+    'weekly_stats': weekly_stats,
+}
+
+
+class QueryCounter:
+    """execute_wrapper: число SQL-запросов без управления транзакциями"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        if not sql.lstrip().upper().startswith(TRANSACTION_STATEMENTS):
+            self.count += 1
+        return execute(sql, params, many, context)
+
+
+def percentiles(values):
+    """p50/p95/p99 (включающий метод, как у numpy по умолчанию)"""
+    if len(values) == 1:
+        return dict.fromkeys(('p50', 'p95', 'p99'), values[0])
+    cuts = statistics.quantiles(values, n=100, method='inclusive')
+    return {'p50': cuts[49], 'p95': cuts[94], 'p99': cuts[98]}
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True, cwd=settings.BASE_DIR,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный замер API: воспроизводимый набор данных (пользователи '
+        'loadtest_*) и прогон основных эндпоинтов через тестовый клиент Django. '
+        'Отчёт в JSON: число запросов к БД, задержки p50/p95/p99 и выделения памяти'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=100,
+            help='Синтетических пользователей в наборе (по умолчанию 100; например, 10000)',
+        )
+        parser.add_argument(
+            '--habits', type=int, default=15,
+            help='Привычек у каждого пользователя (по умолчанию 15)',
+        )
+        parser.add_argument(
+            '--days', type=int, default=730,
+            help='Дней логов до сегодняшнего (по умолчанию 730 — два года)',
+        )
+        parser.add_argument(
+            '--seed', type=int, default=42,
+            help='Зерно генератора данных и выбора запросов (по умолчанию 42)',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=0,
+            help='Процессов для генерации набора (0 — в текущем процессе)',
+        )
+        parser.add_argument(
+            '--skip-dataset', action='store_true',
+            help='Не дозаполнять набор, мерить на уже созданных пользователях',
+        )
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Замеряемых запросов на эндпоинт (по умолчанию 200)',
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=10,
+            help='Прогревочных запросов на эндпоинт, в отчёт не входят (по умолчанию 10)',
+        )
+        parser.add_argument(
+            '--alloc-requests', type=int, default=50,
+            help='Запросов на эндпоинт под tracemalloc (по умолчанию 50; 0 — не мерить память)',
+        )
+        parser.add_argument(
+            '--endpoints', type=str, default=','.join(ENDPOINTS),
+            help=f'Эндпоинты через запятую (по умолчанию все: {",".join(ENDPOINTS)})',
+        )
+        parser.add_argument(
+            '--output', type=str,
+            help='Файл для JSON-отчёта (по умолчанию — stdout)',
+        )
+
+    def handle(self, *args, **options):
+        endpoints = [name.strip() for name in options['endpoints'].split(',') if name.strip()]
+        unknown = set(endpoints) - set(ENDPOINTS)
+        if unknown:
+            raise CommandError(f'Неизвестные эндпоинты: {", ".join(sorted(unknown))}')
+        for option in ('users', 'habits', 'days', 'requests'):
+            if options[option] < 1:
+                raise CommandError(f'--{option} должен быть больше нуля')
+
+        if not options['skip_dataset']:
+            self.stderr.write('Подготовка набора данных...')
+            call_command(
+                'generate_random_logs',
+                users=options['users'],
+                habits=options['habits'],
+                days=options['days'],
+                seed=options['seed'],
+                workers=options['workers'],
+                stdout=self.stderr,
+            )
+
+        usernames = [SYNTHETIC_USERNAME.format(index) for index in range(options['users'])]
+        users = list(get_user_model().objects.filter(username__in=usernames).order_by('username'))
+        if not users:
+            raise CommandError('Нет пользователей loadtest_*: запустите без --skip-dataset')
+        habit_ids = {}
+        for user_id, habit_id in Habit.objects.filter(user__in=users, is_active=True).values_list('user_id', 'id'):
+            habit_ids.setdefault(user_id, []).append(habit_id)
+        users = [user for user in users if user.pk in habit_ids]
+
+        report = {
+            'meta': {
+                'created_at': timezone.now().isoformat(),
+                'git_revision': git_revision(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'seed': options['seed'],
+                'requests': options['requests'],
+                'warmup': options['warmup'],
+                'alloc_requests': options['alloc_requests'],
+            },
+            'dataset': {
+                'users': len(users),
+                'habits_per_user': options['habits'],
+                'days': options['days'],
+                'habits': sum(len(ids) for ids in habit_ids.values()),
+                'logs': HabitLog.objects.filter(user__in=users).count(),
+            },
+            'endpoints': {},
+        }
+
+        # DEBUG=False: запросы не копятся в connection.queries и не искажают память
+        with override_settings(DEBUG=False, ALLOWED_HOSTS=['testserver']):
+            for name in endpoints:
+                self.stderr.write(f'Замер {name}...')
+                report['endpoints'][name] = self._measure(name, users, habit_ids, options)
+
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(f'Отчёт записан в {options["output"]}'))
+        else:
+            self.stdout.write(output)
+
+    def _measure(self, name, users, habit_ids, options):
+        """Прогнать эндпоинт; все изменения данных откатываются"""
+        build_request = ENDPOINTS[name]
+        # Своё зерно на эндпоинт: последовательность запросов не зависит от --endpoints
+        rng = random.Random(f'{options["seed"]}:{name}')
+        client = Client(raise_request_exception=False)
+        tokens = {}
+
+        touched = set()
+
+        def send(user):
+            if user.pk not in tokens:
+                tokens[user.pk] = f'Bearer {AccessToken.for_user(user)}'
+            touched.add(user.pk)
+            method, url, data = build_request(rng, user, habit_ids[user.pk])
+            if data is None:
+                return getattr(client, method)(url, HTTP_AUTHORIZATION=tokens[user.pk])
+            return getattr(client, method)(
+                url, data, content_type='application/json', HTTP_AUTHORIZATION=tokens[user.pk],
+            )
+
+        latencies = []
+        queries = []
+        statuses = {}
+        allocations = []
+        with transaction.atomic():
+            for _ in range(options['warmup']):
+                send(rng.choice(users))
+
+            for _ in range(options['requests']):
+                user = rng.choice(users)
+                counter = QueryCounter()
+                with connection.execute_wrapper(counter):
+                    started = time.perf_counter()
+                    response = send(user)
+                    latencies.append((time.perf_counter() - started) * 1000)
+                queries.append(counter.count)
+                statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+
+            # Память — отдельным проходом: tracemalloc замедляет запросы в разы
+            if options['alloc_requests'] > 0:
+                tracemalloc.start()
+                try:
+                    for _ in range(options['alloc_requests']):
+                        user = rng.choice(users)
+                        before, _peak = tracemalloc.get_traced_memory()
+                        tracemalloc.reset_peak()
+                        send(user)
+                        _current, peak = tracemalloc.get_traced_memory()
+                        allocations.append((peak - before) / 1024)
+                finally:
+                    tracemalloc.stop()
+
+            transaction.set_rollback(True)
+
+        # Кэш статистики мог запомнить откаченные данные
+        for user_id in touched:
+            invalidate_user_stats(user_id)
+
+        result = {
+            'requests': len(latencies),
+            'status_codes': statuses,
+            'queries': {
+                'min': min(queries),
+                'mean': round(statistics.fmean(queries), 2),
+                'max': max(queries),
+            },
+            'latency_ms': {
+                key: round(value, 3)
+                for key, value in {
+                    **percentiles(latencies),
+                    'mean': statistics.fmean(latencies),
+                    'max': max(latencies),
+                }.items()
+            },
+        }
+        if allocations:
+            result['peak_alloc_kib'] = {
+                key: round(value, 1)
+                for key, value in {**percentiles(allocations), 'max': max(allocations)}.items()
+            }
+        return result
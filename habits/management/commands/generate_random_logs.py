@@ -1,18 +1,17 @@
 from __future__ import annotations
 
-import random
-from datetime import date, timedelta
+from concurrent.futures import as_completed
 
-from django.core.management.base import BaseCommand, CommandParser
-from django.db import transaction
+from django.core.management.base import BaseCommand, CommandError, CommandParser
 from django.utils import timezone
 
 from users.models import User
-from habits.models import Habit, HabitLog
+from habits.seeding import SYNTHETIC_HABITS, ensure_synthetic_users
+from habits.workers import generate_logs_chunk, process_pool
 
 
 class Command(BaseCommand):
-    help = "Generate random HabitLog entries for a user over a date range"
+    help = "Generate random HabitLog entries for a user (or many synthetic users) over a date range"
 
     def add_arguments(self, parser: CommandParser) -> None:
         parser.add_argument(
@@ -38,99 +37,94 @@ class Command(BaseCommand):
             action="store_true",
             help="If set, existing logs for those dates will be replaced",
         )
+        parser.add_argument(
+            "--users",
+            type=int,
+            default=0,
+            help=(
+                "Populate N synthetic users loadtest_00000.. instead of --username, "
+                "creating missing users with habits (load-test datasets)"
+            ),
+        )
+        parser.add_argument(
+            "--habits",
+            type=int,
+            default=len(SYNTHETIC_HABITS),
+            help=f"Habits per new synthetic user (default: {len(SYNTHETIC_HABITS)})",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=0,
+            help="Worker processes for --users (0 = generate in the current process)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=50,
+            help="Users per worker task for --users (default: 50)",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            help="Random seed; the same seed gives the same logs for a user",
+        )
 
     def handle(self, *args, **options):
-        username: str = options["username"]
         days: int = options["days"]
         baseline_completion: float = max(0.0, min(1.0, options["completion"]))
         overwrite: bool = options["overwrite"]
-
-        try:
-            user: User = User.objects.get(username=username)
-        except User.DoesNotExist:
-            self.stderr.write(self.style.ERROR(f"User '{username}' not found"))
-            return
-
-        habits = list(Habit.objects.filter(user=user, is_active=True))
-        if not habits:
-            self.stdout.write(self.style.WARNING("No active habits to populate."))
-            return
-
+        if days < 1:
+            raise CommandError("--days must be positive")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive")
+        if options["habits"] < 1:
+            raise CommandError("--habits must be positive")
+
+        if options["users"] > 0:
+            user_ids = ensure_synthetic_users(options["users"], options["habits"])
+            label = f"Users: {len(user_ids)}"
+        else:
+            username: str = options["username"]
+            try:
+                user: User = User.objects.get(username=username)
+            except User.DoesNotExist:
+                self.stderr.write(self.style.ERROR(f"User '{username}' not found"))
+                return
+            if not user.habits.filter(is_active=True).exists():
+                self.stdout.write(self.style.WARNING("No active habits to populate."))
+                return
+            user_ids = [user.pk]
+            label = f"User: {user.username}"
+
+        # Logs are written with bulk_create (an upsert for --overwrite); habit
+        # stats, daily rollups and analytics are recomputed once per user
+        # afterwards. SQLite serializes writers, so --workers pays off on PostgreSQL
         today = timezone.now().date()
-        start_date = today - timedelta(days=days - 1)
+        task_args = (days, baseline_completion, overwrite, today, options["seed"])
+        chunks = [
+            user_ids[i:i + options["batch_size"]]
+            for i in range(0, len(user_ids), options["batch_size"])
+        ]
 
         created_count = 0
         updated_count = 0
-
-        # Slightly vary completion chance per habit to look more realistic
-        habit_completion_bias = {
-            habit.id: max(0.05, min(0.95, baseline_completion + random.uniform(-0.15, 0.15)))
-            for habit in habits
-        }
-
-        with transaction.atomic():
-            for offset in range(days):
-                current_date = start_date + timedelta(days=offset)
-
-                for habit in habits:
-                    # Skip future dates just in case
-                    if current_date > today:
-                        continue
-
-                    # Decide status
-                    p = habit_completion_bias[habit.id]
-                    rnd = random.random()
-                    if rnd < p:
-                        status = "completed"
-                    elif rnd < p + (1 - p) * 0.2:
-                        status = "partial"
-                    else:
-                        status = "skipped"
-
-                    value = None
-                    if status != "skipped":
-                        if habit.habit_type == "numeric":
-                            target = float(habit.target_value or 1)
-                            # 50%..130% of target for completed, 20%..70% for partial
-                            low, high = (0.5, 1.3) if status == "completed" else (0.2, 0.7)
-                            value = round(target * random.uniform(low, high), 2)
-                        elif habit.habit_type == "timer":
-                            target = float(habit.target_value or 10)
-                            low, high = (0.5, 1.5) if status == "completed" else (0.2, 0.8)
-                            value = round(target * random.uniform(low, high), 2)
-                        elif habit.habit_type == "boolean":
-                            value = 1 if status == "completed" else 0.5
-                        elif habit.habit_type == "negative":
-                            # For negative habits, completed means no-relapse; value can be 1
-                            value = 1 if status == "completed" else 0
-
-                    existing = HabitLog.objects.filter(habit=habit, date=current_date).first()
-                    if existing:
-                        if overwrite:
-                            existing.status = status
-                            existing.value = value
-                            existing.notes = existing.notes or ""
-                            if existing.notes:
-                                existing.notes += "\n"
-                            existing.notes += f"Auto-filled on {today.isoformat()}"
-                            existing.save(update_fields=["status", "value", "notes", "updated_at"])
-                            updated_count += 1
-                        # else: keep existing
-                        continue
-
-                    HabitLog.objects.create(
-                        habit=habit,
-                        date=current_date,
-                        status=status,
-                        value=value,
-                        notes=f"Auto-filled for {current_date.isoformat()}",
-                    )
-                    created_count += 1
+        if options["workers"] > 0 and len(chunks) > 1:
+            with process_pool(options["workers"]) as pool:
+                futures = [pool.submit(generate_logs_chunk, chunk, *task_args) for chunk in chunks]
+                for done, future in enumerate(as_completed(futures), 1):
+                    created, updated = future.result()
+                    created_count += created
+                    updated_count += updated
+                    self.stdout.write(f"Chunks: {done}/{len(chunks)}")
+        else:
+            for chunk in chunks:
+                created, updated = generate_logs_chunk(chunk, *task_args)
+                created_count += created
+                updated_count += updated
 
         self.stdout.write(
             self.style.SUCCESS(
-                f"Done. Created: {created_count}, Updated: {updated_count}, User: {user.username}, Days: {days}, Habits: {len(habits)}"
+                f"Done. Created: {created_count}, Updated: {updated_count}, {label}, Days: {days}"
             )
         )
-
-
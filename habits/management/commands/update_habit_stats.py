@@ -1,51 +1,90 @@
-from django.core.management.base import BaseCommand
-from habits.models import Habit, HabitLog
-from datetime import date, timedelta
+from concurrent.futures import as_completed
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from habits.models import Habit
+from habits.workers import process_pool, recompute_stats_chunk
+
 
 class Command(BaseCommand):
-    help = 'Обновить статистику всех привычек'
+    help = 'Обновить статистику привычек (пакетный пересчёт)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько привычек пересчитывать за один проход (по умолчанию 500)',
+        )
+        parser.add_argument(
+            '--user', type=str,
+            help='Пересчитать только привычки пользователя с этим username',
+        )
+        parser.add_argument(
+            '--since', type=str,
+            help='Только привычки, логи которых менялись с этой даты (YYYY-MM-DD)',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=0,
+            help='Количество процессов для параллельного пересчёта (0 — в текущем процессе)',
+        )
 
     def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size должен быть больше нуля')
+
         habits = Habit.objects.all()
+        if options['user']:
+            habits = habits.filter(user__username=options['user'])
+        if options['since']:
+            try:
+                since = datetime.strptime(options['since'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('Неверный формат даты --since, ожидается YYYY-MM-DD')
+            habits = habits.filter(logs__updated_at__date__gte=since).distinct()
+
+        total = habits.count()
+        today = timezone.localdate()
+        processed = 0
         updated_count = 0
-        
-        for habit in habits:
-            # Подсчитываем логи
-            logs = HabitLog.objects.filter(habit=habit)
-            total_completions = logs.filter(status='completed').count()
-            total_skips = logs.filter(status='skipped').count()
-            
-            # Обновляем статистику
-            habit.total_completions = total_completions
-            habit.total_skips = total_skips
-            
-            # Вычисляем текущий стрик
-            current_streak = 0
-            longest_streak = 0
-            temp_streak = 0
-            
-            # Проверяем последние 30 дней
-            for i in range(30):
-                check_date = date.today() - timedelta(days=i)
-                log = logs.filter(date=check_date).first()
-                
-                if log and log.status == 'completed':
-                    temp_streak += 1
-                    if i == 0:  # Сегодня
-                        current_streak = temp_streak
-                else:
-                    longest_streak = max(longest_streak, temp_streak)
-                    temp_streak = 0
-            
-            # Обновляем стрики
-            habit.streak = current_streak
-            habit.longest_streak = max(longest_streak, temp_streak)
-            
-            habit.save(update_fields=['total_completions', 'total_skips', 'streak', 'longest_streak'])
-            updated_count += 1
-            
-            self.stdout.write(f"✅ {habit.name}: {total_completions} выполнено, {total_skips} пропущено, стрик: {current_streak}")
-            
+
+        if options['workers'] > 0:
+            with process_pool(options['workers']) as pool:
+                futures = [
+                    pool.submit(recompute_stats_chunk, chunk, today)
+                    for chunk in self._chunks(habits, batch_size)
+                ]
+                for future in as_completed(futures):
+                    chunk_size, updated = future.result()
+                    processed += chunk_size
+                    updated_count += updated
+                    self._report(processed, total)
+        else:
+            for chunk in self._chunks(habits, batch_size):
+                chunk_size, updated = recompute_stats_chunk(chunk, today)
+                processed += chunk_size
+                updated_count += updated
+                self._report(processed, total)
+
         self.stdout.write(
-            self.style.SUCCESS(f'Успешно обновлена статистика для {updated_count} привычек')
+            self.style.SUCCESS(
+                f'Успешно обновлена статистика: {updated_count} из {processed} привычек изменились'
+            )
         )
+
+    def _chunks(self, habits, batch_size):
+        """Идентификаторы привычек порциями по первичному ключу (keyset)"""
+        last_id = None
+        while True:
+            page = habits.order_by('pk')
+            if last_id is not None:
+                page = page.filter(pk__gt=last_id)
+            chunk = list(page.values_list('pk', flat=True)[:batch_size])
+            if not chunk:
+                return
+            yield chunk
+            last_id = chunk[-1]
+
+    def _report(self, processed, total):
+        self.stdout.write(f'Обработано {processed}/{total}')
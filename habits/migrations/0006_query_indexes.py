@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0005_tombstone'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='habit',
+            index=models.Index(condition=models.Q(('is_archived', False)), fields=['user', 'group'], name='habit_user_active_group'),
+        ),
+        migrations.AddIndex(
+            model_name='habitlog',
+            index=models.Index(fields=['habit', 'status', 'date'], name='habitlog_habit_status_date'),
+        ),
+        migrations.AddIndex(
+            model_name='habitlog',
+            index=models.Index(condition=models.Q(('status', 'completed')), fields=['habit', 'date'], name='habitlog_completed'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+BATCH_SIZE = 5000
+
+
+def backfill_habitlog_user(apps, schema_editor):
+    """Заполнить HabitLog.user из привычки порциями по BATCH_SIZE логов"""
+    Habit = apps.get_model('habits', 'Habit')
+    HabitLog = apps.get_model('habits', 'HabitLog')
+    owner = Subquery(Habit.objects.filter(pk=OuterRef('habit_id')).values('user_id')[:1])
+    while True:
+        ids = list(HabitLog.objects.filter(user__isnull=True).values_list('pk', flat=True)[:BATCH_SIZE])
+        if not ids:
+            break
+        HabitLog.objects.filter(pk__in=ids).update(user_id=owner)
+
+
+class Migration(migrations.Migration):
+    # Каждая порция коммитится отдельно, чтобы не держать длинную транзакцию
+    atomic = False
+
+    dependencies = [
+        ('habits', '0007_habitlog_user'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_habitlog_user, migrations.RunPython.noop),
+    ]
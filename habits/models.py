@@ -2,7 +2,9 @@ import uuid
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.db.models import Count, Exists, OuterRef, Q
 from habit_tracker.settings import uuid7
+from .stats import completion_rate, habit_streaks
 
 User = get_user_model()
 
@@ -32,6 +34,40 @@ class HabitGroup(models.Model):
         return f"{self.user.username} - {self.name}"
 
 
+class HabitQuerySet(models.QuerySet):
+    """QuerySet привычек"""
+
+    def with_stats(self, logs=True, logs_from=None, logs_to=None):
+        """
+        Списочный режим: счётчики логов и статус «выполнено сегодня»
+        считаются аннотациями, связанные объекты подгружаются заранее.
+
+        Вложенные логи подгружаются одним запросом и только за период
+        ``logs_from``..``logs_to``; при ``logs=False`` не подгружаются вовсе.
+        """
+        from django.utils import timezone
+
+        today = timezone.now().date()
+        queryset = self.select_related('group').prefetch_related('reminders')
+        if logs:
+            logs_queryset = HabitLog.objects.all()
+            if logs_from:
+                logs_queryset = logs_queryset.filter(date__gte=logs_from)
+            if logs_to:
+                logs_queryset = logs_queryset.filter(date__lte=logs_to)
+            queryset = queryset.prefetch_related(models.Prefetch('logs', queryset=logs_queryset))
+        if not queryset.query.order_by:
+            # Meta.ordering не применяется к запросам с GROUP BY
+            queryset = queryset.order_by(*self.model._meta.ordering)
+        return queryset.annotate(
+            completions_count=Count('logs', filter=Q(logs__status='completed')),
+            skips_count=Count('logs', filter=Q(logs__status='skipped')),
+            completed_today=Exists(
+                HabitLog.objects.filter(habit=OuterRef('pk'), date=today, status='completed')
+            ),
+        )
+
+
 class Habit(models.Model):
     """Модель привычки"""
     
@@ -99,10 +135,20 @@ class Habit(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = HabitQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Привычка'
         verbose_name_plural = 'Привычки'
         ordering = ['group__order', 'group__name', 'name']
+        indexes = [
+            # Список активных привычек пользователя (+ фильтр по группе)
+            models.Index(
+                fields=['user', 'group'],
+                condition=models.Q(is_archived=False),
+                name='habit_user_active_group',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.name}"
@@ -110,10 +156,7 @@ class Habit(models.Model):
     @property
     def completion_rate(self):
         """Процент выполнения привычки"""
-        total = self.total_completions + self.total_skips
-        if total == 0:
-            return 0
-        return round((self.total_completions / total) * 100, 2)
+        return completion_rate(self.total_completions, self.total_skips)
 
     @property
     def calculated_total_completions(self):
@@ -128,93 +171,58 @@ class Habit(models.Model):
     @property
     def calculated_streak(self):
         """Подсчитать текущий стрик на лету"""
-        from datetime import timedelta
-        from django.utils import timezone
-
-        today = timezone.localdate()
-        start_date = today - timedelta(days=29)  # включая сегодня: 30 дней
-
-        completed_dates = set(
-            self.logs.filter(
-                status='completed',
-                date__gte=start_date,
-                date__lte=today,
-            ).values_list('date', flat=True)
-        )
-
-        current_streak = 0
-        for i in range(30):
-            check_date = today - timedelta(days=i)
-            if check_date in completed_dates:
-                current_streak += 1
-            else:
-                break
-        return current_streak
+        return habit_streaks(self.logs.all()).get(self.pk, (0, 0))[0]
 
     @property
     def calculated_longest_streak(self):
         """Подсчитать самый длинный стрик на лету"""
-        from datetime import timedelta
-        from django.utils import timezone
-
-        today = timezone.localdate()
-        start_date = today - timedelta(days=364)  # включая сегодня: 365 дней
-
-        completed_dates = set(
-            self.logs.filter(
-                status='completed',
-                date__gte=start_date,
-                date__lte=today,
-            ).values_list('date', flat=True)
-        )
-
-        longest_streak = 0
-        temp_streak = 0
-        for i in range(365):
-            check_date = today - timedelta(days=i)
-            if check_date in completed_dates:
-                temp_streak += 1
-            else:
-                longest_streak = max(longest_streak, temp_streak)
-                temp_streak = 0
-
-        return max(longest_streak, temp_streak)
+        return habit_streaks(self.logs.all()).get(self.pk, (0, 0))[1]
 
     def recalculate_stats(self, *, save: bool = True):
         """
-        Пересчитать и (опционально) сохранить агрегированную статистику привычки.
+        Полностью пересчитать и (опционально) сохранить статистику привычки.
 
-        Важно: не делаем инкременты/декременты вручную, чтобы не ломаться на
-        изменении статуса лога (skipped->completed и т.п.) и удалениях.
+        При обычных изменениях логов статистика обновляется инкрементально
+        (см. habits.stats.apply_log_change); полный пересчёт нужен для
+        восстановления после массовых операций.
         """
-        self.total_completions = self.calculated_total_completions
-        self.total_skips = self.calculated_total_skips
-        self.streak = self.calculated_streak
-        self.longest_streak = self.calculated_longest_streak
+        from .stats import STATS_FIELDS, compute_full_stats
+
+        stats = compute_full_stats(self)
+        for field, value in zip(STATS_FIELDS, stats):
+            setattr(self, field, value)
 
         if save:
-            self.save(update_fields=[
-                'total_completions',
-                'total_skips',
-                'streak',
-                'longest_streak',
-                'updated_at',
-            ])
+            self.save(update_fields=STATS_FIELDS + ['updated_at'])
 
     def archive(self):
         """Архивировать привычку"""
         from django.utils import timezone
+        from .quotas import quota_released
         self.is_archived = True
         self.archived_at = timezone.now()
         self.is_active = False
         self.save()
+        quota_released(self.user_id, 'habits')
 
     def unarchive(self):
         """Восстановить привычку из архива"""
+        from .quotas import quota_added
         self.is_archived = False
         self.archived_at = None
         self.is_active = True
         self.save()
+        quota_added(self.user_id, 'habits')
+
+
+class HabitLogQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        """Заполнить владельца логов из привычки — bulk_create не вызывает save()"""
+        objs = list(objs)
+        for log in objs:
+            if log.user_id is None:
+                log.user_id = log.habit.user_id
+        return super().bulk_create(objs, *args, **kwargs)
 
 
 class HabitLog(models.Model):
@@ -229,6 +237,11 @@ class HabitLog(models.Model):
     ]
     
     habit = models.ForeignKey(Habit, on_delete=models.CASCADE, related_name='logs')
+    # Копия habit.user: выборки по пользователю идут по индексу без JOIN
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='habit_logs',
+        editable=False, db_index=False,
+    )
     date = models.DateField(verbose_name='Дата')
     status = models.CharField(max_length=20, choices=COMPLETION_STATUS, default='completed', verbose_name='Статус')
     value = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, verbose_name='Значение')
@@ -243,10 +256,51 @@ class HabitLog(models.Model):
         verbose_name_plural = 'Логи привычек'
         unique_together = ['habit', 'date']
         ordering = ['-date']
+        indexes = [
+            # Логи пользователя за период
+            models.Index(fields=['user', 'date'], name='habitlog_user_date'),
+            # Счётчики по статусам и выборки за период
+            models.Index(fields=['habit', 'status', 'date'], name='habitlog_habit_status_date'),
+            # Серии считаются только по выполнениям: покрывающий частичный индекс
+            models.Index(
+                fields=['habit', 'date'],
+                condition=models.Q(status='completed'),
+                name='habitlog_completed',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.habit.name} - {self.date} ({self.get_status_display()})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_state()
+        return instance
+
+    objects = HabitLogQuerySet.as_manager()
+
+    def save(self, *args, **kwargs):
+        # user денормализован из привычки: держим его в согласии с ней всегда,
+        # в том числе когда лог переносят на другую привычку
+        self.user_id = self.habit.user_id
+        # Значение из запроса может прийти строкой или float — приводим к Decimal
+        # до сигналов: сводки складывают его с Decimal из БД
+        self.value = self._meta.get_field('value').to_python(self.value)
+        super().save(*args, **kwargs)
+        # После всех обработчиков post_save: они сравнивают с прежним состоянием
+        self.remember_state()
+
+    def remember_state(self):
+        """
+        Запомнить сохранённые в БД дату, статус и значение, а также привычку
+        и пользователя (для инкрементальной статистики и дневных сводок)
+        """
+        if all(field in self.__dict__ for field in ('date', 'status', 'value')):
+            self._saved_state = (self.date, self.status, self.value)
+        if all(field in self.__dict__ for field in ('habit_id', 'user_id')):
+            self._saved_owner = (self.habit_id, self.user_id)
+
 
 class HabitReminder(models.Model):
     """Напоминания о привычках"""
@@ -269,3 +323,32 @@ class HabitReminder(models.Model):
     
     def __str__(self):
         return f"{self.habit.name} - {self.time}"
+
+
+class Tombstone(models.Model):
+    """Запись об удалённом объекте — для дельта-синхронизации клиентов"""
+
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
+
+    OBJECT_TYPES = [
+        ('group', 'Группа привычек'),
+        ('habit', 'Привычка'),
+        ('log', 'Лог привычки'),
+        ('reminder', 'Напоминание'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='tombstones')
+    object_type = models.CharField(max_length=20, choices=OBJECT_TYPES, verbose_name='Тип объекта')
+    object_id = models.UUIDField(verbose_name='ID объекта')
+    deleted_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата удаления')
+
+    class Meta:
+        verbose_name = 'Удалённый объект'
+        verbose_name_plural = 'Удалённые объекты'
+        ordering = ['deleted_at']
+        indexes = [
+            models.Index(fields=['user', 'deleted_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_object_type_display()} {self.object_id}"
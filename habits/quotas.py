@@ -0,0 +1,81 @@
+"""
+Лимиты тарифа на число привычек и групп (max_habits, max_groups).
+
+Число активных (не архивных) привычек и групп хранится в счётчиках
+пользователя. Проверка лимита и занятие места — один условный UPDATE
+(reserve_quota), поэтому параллельные создания не превысят лимит, а
+сам лимит берётся из User.subscription_tier без запросов.
+
+Счётчики меняются при создании, удалении, архивации и восстановлении
+(quota_added/quota_released); место, уже занятое через reserved_quota,
+повторно не учитывается.
+"""
+import contextvars
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from rest_framework.exceptions import PermissionDenied
+
+from payments.entitlements import plan_features
+
+# Вид объекта -> (счётчик в User, лимит в PLAN_FEATURES)
+QUOTAS = {
+    'habits': ('active_habits_count', 'max_habits'),
+    'groups': ('groups_count', 'max_groups'),
+}
+
+# Места, занятые в текущем контексте и ещё не использованные
+_reserved = contextvars.ContextVar('reserved_quotas', default=None)
+
+
+class QuotaExceeded(PermissionDenied):
+    default_detail = 'Достигнут лимит тарифа'
+    default_code = 'quota_exceeded'
+
+
+def reserve_quota(user, kind):
+    """Занять место в лимите или выбросить QuotaExceeded"""
+    counter, limit_key = QUOTAS[kind]
+    limit = plan_features(user)[limit_key]
+    updated = get_user_model().objects.filter(
+        pk=user.pk,
+        **{f'{counter}__lt': limit},
+    ).update(**{counter: F(counter) + 1})
+    if not updated:
+        raise QuotaExceeded(f'Достигнут лимит тарифа: не более {limit}')
+
+
+@contextmanager
+def reserved_quota(user, kind):
+    """
+    Занять место и выполнить создание/восстановление в одной транзакции.
+
+    Объект, сохранённый внутри блока, не увеличивает счётчик повторно.
+    """
+    with transaction.atomic():
+        reserve_quota(user, kind)
+        token = _reserved.set({kind})
+        try:
+            yield
+        finally:
+            _reserved.reset(token)
+
+
+def quota_added(user_id, kind):
+    """Учесть новый (или восстановленный) объект в счётчике"""
+    reserved = _reserved.get()
+    if reserved and kind in reserved:
+        reserved.discard(kind)
+        return
+    counter, _ = QUOTAS[kind]
+    get_user_model().objects.filter(pk=user_id).update(**{counter: F(counter) + 1})
+
+
+def quota_released(user_id, kind):
+    """Освободить место после удаления или архивации"""
+    counter, _ = QUOTAS[kind]
+    get_user_model().objects.filter(pk=user_id, **{f'{counter}__gt': 0}).update(
+        **{counter: F(counter) - 1}
+    )
@@ -0,0 +1,193 @@
+"""
+Генерация случайных логов для демо-данных и нагрузочных наборов.
+
+Логи пишутся пачками (bulk_create, при перезаписи — upsert) в обход
+сигналов, поэтому после записи статистика привычек, дневные сводки,
+аналитика и счётчики пользователя пересчитываются явно — один раз на
+пользователя.
+"""
+import random
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from analytics.counters import store_user_analytics
+from analytics.heatmap import invalidate_heatmaps
+from analytics.rollups import rebuild_rollups
+from habit_tracker.ids import uuid7_batch
+from users.stats import invalidate_user_stats, recompute_user_stats
+
+from .models import Habit, HabitLog
+from .stats import recompute_habit_stats
+
+SYNTHETIC_USERNAME = 'loadtest_{:05d}'
+
+# Привычки синтетического пользователя: (название, тип, цель)
+SYNTHETIC_HABITS = [
+    ('Зарядка', 'boolean', None),
+    ('Вода, стаканы', 'numeric', 8),
+    ('Чтение, мин', 'timer', 30),
+    ('Без сахара', 'negative', None),
+    ('Шаги, тыс.', 'numeric', 10),
+]
+
+
+def random_status(rng, completion):
+    """Статус дня при вероятности выполнения ``completion``"""
+    rnd = rng.random()
+    if rnd < completion:
+        return 'completed'
+    if rnd < completion + (1 - completion) * 0.2:
+        return 'partial'
+    return 'skipped'
+
+
+def random_value(rng, habit, status):
+    """Значение лога, правдоподобное для типа привычки"""
+    if status == 'skipped':
+        return None
+    if habit.habit_type == 'numeric':
+        target = float(habit.target_value or 1)
+        # 50%..130% цели для выполненных, 20%..70% для частичных
+        low, high = (0.5, 1.3) if status == 'completed' else (0.2, 0.7)
+        return round(target * rng.uniform(low, high), 2)
+    if habit.habit_type == 'timer':
+        target = float(habit.target_value or 10)
+        low, high = (0.5, 1.5) if status == 'completed' else (0.2, 0.8)
+        return round(target * rng.uniform(low, high), 2)
+    if habit.habit_type == 'boolean':
+        return 1 if status == 'completed' else 0.5
+    if habit.habit_type == 'negative':
+        # Для отказа от привычки выполнено — значит без срыва
+        return 1 if status == 'completed' else 0
+    return None
+
+
+def generate_user_logs(user, days, completion, overwrite=False, today=None, rng=None, batch_size=1000):
+    """
+    Заполнить активные привычки пользователя логами за последние ``days`` дней.
+
+    Существующие пары (привычка, дата) читаются одним запросом; без
+    ``overwrite`` они не меняются. Возвращает (создано, обновлено).
+    """
+    rng = rng or random.Random()
+    today = today or timezone.localdate()
+    start_date = today - timedelta(days=days - 1)
+
+    habits = list(Habit.objects.filter(user=user, is_active=True))
+    if not habits:
+        return 0, 0
+
+    existing = HabitLog.objects.filter(
+        user=user, habit__in=habits, date__gte=start_date, date__lte=today,
+    )
+    if overwrite:
+        existing = {(log.habit_id, log.date): log for log in existing.only('habit_id', 'date', 'notes')}
+    else:
+        existing = set(existing.values_list('habit_id', 'date'))
+
+    # Немного разная вероятность выполнения у привычек — реалистичнее
+    bias = {
+        habit.id: max(0.05, min(0.95, completion + rng.uniform(-0.15, 0.15)))
+        for habit in habits
+    }
+
+    rows = []
+    updated = 0
+    for offset in range(days):
+        current_date = start_date + timedelta(days=offset)
+        for habit in habits:
+            status = random_status(rng, bias[habit.id])
+            value = random_value(rng, habit, status)
+            key = (habit.id, current_date)
+            if key not in existing:
+                notes = f'Auto-filled for {current_date.isoformat()}'
+            elif overwrite:
+                old_notes = existing[key].notes
+                notes = f'{old_notes}\n' if old_notes else ''
+                notes += f'Auto-filled on {today.isoformat()}'
+                updated += 1
+            else:
+                continue
+            rows.append(HabitLog(
+                habit=habit,
+                user_id=user.pk,
+                date=current_date,
+                status=status,
+                value=value,
+                notes=notes,
+            ))
+
+    for log, log_id in zip(rows, uuid7_batch(len(rows))):
+        log.id = log_id
+
+    with transaction.atomic():
+        if overwrite:
+            # Upsert по (привычка, дата) вместо bulk_update: тот строит CASE
+            # на каждое поле и заметно медленнее; updated_at ставит auto_now
+            HabitLog.objects.bulk_create(
+                rows,
+                batch_size=batch_size,
+                update_conflicts=True,
+                unique_fields=['habit', 'date'],
+                update_fields=['status', 'value', 'notes', 'updated_at'],
+            )
+        else:
+            HabitLog.objects.bulk_create(rows, batch_size=batch_size)
+        refresh_user_aggregates(user.pk, [habit.id for habit in habits], today)
+
+    invalidate_heatmaps([(log.habit_id, log.date) for log in rows])
+    return len(rows) - updated, updated
+
+
+def refresh_user_aggregates(user_id, habit_ids, today=None):
+    """Пересчитать всё, что обычно поддерживают сигналы HabitLog"""
+    recompute_habit_stats(habit_ids, today)
+    rebuild_rollups([user_id])
+    store_user_analytics([user_id])
+    recompute_user_stats(get_user_model().objects.filter(pk=user_id))
+    invalidate_user_stats(user_id)
+
+
+def ensure_synthetic_users(count, habits_per_user=len(SYNTHETIC_HABITS)):
+    """
+    Создать недостающих пользователей loadtest_00000.. с привычками.
+
+    Пароль не задаётся (вход невозможен). Пользователи и привычки пишутся
+    через bulk_create, счётчик лимита привычек выставляется сразу.
+    Возвращает id всех ``count`` пользователей по порядку.
+    """
+    User = get_user_model()
+    usernames = [SYNTHETIC_USERNAME.format(index) for index in range(count)]
+    known = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+    # Шаблоны повторяются по кругу: «Зарядка», …, «Зарядка 2», …
+    templates = []
+    for index in range(habits_per_user):
+        name, habit_type, target = SYNTHETIC_HABITS[index % len(SYNTHETIC_HABITS)]
+        if index >= len(SYNTHETIC_HABITS):
+            name = f'{name} {index // len(SYNTHETIC_HABITS) + 1}'
+        templates.append((name, habit_type, target))
+
+    missing = [username for username in usernames if username not in known]
+    password = make_password(None)
+    users = [
+        User(id=user_id, username=username, password=password, active_habits_count=len(templates))
+        for username, user_id in zip(missing, uuid7_batch(len(missing)))
+    ]
+    habits = [
+        Habit(user=user, name=name, habit_type=habit_type, target_value=target)
+        for user in users
+        for name, habit_type, target in templates
+    ]
+    for habit, habit_id in zip(habits, uuid7_batch(len(habits))):
+        habit.id = habit_id
+
+    with transaction.atomic():
+        User.objects.bulk_create(users, batch_size=1000)
+        Habit.objects.bulk_create(habits, batch_size=1000)
+
+    ids = dict(User.objects.filter(username__in=usernames).values_list('username', 'id'))
+    return [ids[username] for username in usernames]
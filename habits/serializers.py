@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import HabitGroup, Habit, HabitLog, HabitReminder
+from .stats import attach_streaks, completion_rate
 
 class HabitGroupSerializer(serializers.ModelSerializer):
     """Сериализатор для группы привычек"""
@@ -20,9 +21,30 @@ class HabitLogSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = HabitLog
-        fields = '__all__'
+        exclude = ['user']
         read_only_fields = ['created_at', 'updated_at']
 
+class HabitSyncSerializer(serializers.ModelSerializer):
+    """Привычка без вложенных объектов и расчётных полей — для синхронизации"""
+    class Meta:
+        model = Habit
+        fields = '__all__'
+
+class HabitLogBulkItemSerializer(serializers.Serializer):
+    """Одна операция пакетной отметки: лог привычки за дату"""
+    habit_id = serializers.UUIDField()
+    date = serializers.DateField()
+    status = serializers.ChoiceField(choices=HabitLog.COMPLETION_STATUS, default='completed')
+    value = serializers.DecimalField(max_digits=10, decimal_places=2, required=False, allow_null=True)
+
+class HabitListSerializer(serializers.ListSerializer):
+    """Списочный режим: серии считаются для всей страницы одним запросом"""
+
+    def to_representation(self, data):
+        habits = list(data.all() if hasattr(data, 'all') else data)
+        attach_streaks(habits)
+        return super().to_representation(habits)
+
 class HabitSerializer(serializers.ModelSerializer):
     """Сериализатор для привычки"""
     reminders = HabitReminderSerializer(many=True, read_only=True)
@@ -40,28 +62,51 @@ class HabitSerializer(serializers.ModelSerializer):
     class Meta:
         model = Habit
         fields = '__all__'
-        read_only_fields = ['user', 'created_at', 'updated_at']
+        read_only_fields = ['user', 'is_archived', 'archived_at', 'created_at', 'updated_at']
+        list_serializer_class = HabitListSerializer
+
+    def to_representation(self, instance):
+        # Одиночная привычка: обе серии одним запросом, как и в списке
+        attach_streaks([instance])
+        return super().to_representation(instance)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        # ?logs=none — вложенные логи не отдаём
+        if not self.context.get('include_logs', True):
+            fields.pop('logs')
+        return fields
+
+    # Если привычка загружена через Habit.objects.with_stats(), значения
+    # берутся из аннотаций, иначе считаются отдельными запросами.
 
     def get_total_completions(self, obj):
+        if hasattr(obj, 'completions_count'):
+            return obj.completions_count
         return obj.calculated_total_completions
 
     def get_total_skips(self, obj):
+        if hasattr(obj, 'skips_count'):
+            return obj.skips_count
         return obj.calculated_total_skips
 
     def get_streak(self, obj):
+        if hasattr(obj, 'prefetched_streaks'):
+            return obj.prefetched_streaks[0]
         return obj.calculated_streak
 
     def get_longest_streak(self, obj):
+        if hasattr(obj, 'prefetched_streaks'):
+            return obj.prefetched_streaks[1]
         return obj.calculated_longest_streak
 
     def get_completion_rate(self, obj):
-        total = obj.calculated_total_completions + obj.calculated_total_skips
-        if total == 0:
-            return 0
-        return round((obj.calculated_total_completions / total) * 100, 2)
+        return completion_rate(self.get_total_completions(obj), self.get_total_skips(obj))
 
     def get_is_completed_today(self, obj):
         """Проверяет, выполнена ли привычка сегодня"""
+        if hasattr(obj, 'completed_today'):
+            return obj.completed_today
         from django.utils import timezone
         today = timezone.now().date()
         return obj.logs.filter(
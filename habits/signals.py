@@ -0,0 +1,107 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from users.stats import schedule_user_stats_update
+
+from .models import Habit, HabitGroup, HabitLog, HabitReminder, Tombstone
+from .quotas import quota_added, quota_released
+from .stats import apply_log_change
+
+
+def _is_cascade(origin, model):
+    """Удаление пришло каскадом от другого объекта (привычки, пользователя)"""
+    return origin is not None and getattr(origin, 'model', type(origin)) is not model
+
+
+def _record_tombstone(user_id, object_type, object_id):
+    Tombstone.objects.create(user_id=user_id, object_type=object_type, object_id=object_id)
+
+
+@receiver(post_save, sender=HabitLog)
+def habit_log_saved(sender, instance, created, raw=False, **kwargs):
+    """Обновить статистику привычки после создания/изменения лога"""
+    if raw:
+        return
+    old = None if created else getattr(instance, '_saved_state', None)
+    source = None if created else getattr(instance, '_saved_owner', None)
+    moved = source is not None and source[0] != instance.habit_id
+    if moved:
+        # Лог перенесли на другую привычку: для прежней это удаление,
+        # для новой — создание
+        _log_moved_out(instance, old, *source)
+        old = None
+    if not created and not moved and old is None:
+        # Прежнее состояние лога неизвестно — пересчитываем полностью
+        instance.habit.recalculate_stats()
+    else:
+        apply_log_change(instance.habit, old=old, new=(instance.date, instance.status))
+    schedule_user_stats_update(instance.user_id)
+
+
+def _log_moved_out(instance, old, habit_id, user_id):
+    """Убрать перенесённый лог из статистики прежней привычки и её владельца"""
+    habit = Habit.objects.filter(pk=habit_id).first()
+    if habit is not None:
+        if old is None:
+            habit.recalculate_stats()
+        else:
+            apply_log_change(habit, old=old)
+    if user_id != instance.user_id:
+        schedule_user_stats_update(user_id)
+        # У прежнего владельца лог пропал — клиенты узнают об этом по tombstone
+        _record_tombstone(user_id, 'log', instance.pk)
+
+
+@receiver(post_delete, sender=HabitLog)
+def habit_log_deleted(sender, instance, origin=None, **kwargs):
+    """Обновить статистику привычки после удаления лога"""
+    # При каскадном удалении привычки (или пользователя) пересчитывать нечего,
+    # а клиенты удаляют логи вместе с привычкой по её tombstone
+    if _is_cascade(origin, HabitLog):
+        return
+    old = getattr(instance, '_saved_state', (instance.date, instance.status, instance.value))
+    apply_log_change(instance.habit, old=old)
+    schedule_user_stats_update(instance.user_id)
+    _record_tombstone(instance.user_id, 'log', instance.pk)
+
+
+@receiver(post_save, sender=Habit)
+def habit_saved(sender, instance, created, raw=False, **kwargs):
+    """Новая привычка меняет счётчик созданных привычек и занимает место в лимите"""
+    if created and not raw:
+        if not instance.is_archived:
+            quota_added(instance.user_id, 'habits')
+        schedule_user_stats_update(instance.user_id)
+
+
+@receiver(post_delete, sender=Habit)
+def habit_deleted(sender, instance, origin=None, **kwargs):
+    """Вместе с привычкой удалены её логи — обновляем статистику пользователя"""
+    # Пользователь удаляется (объектом или QuerySet'ом) — счётчики и tombstone не нужны
+    if _is_cascade(origin, Habit):
+        return
+    if not instance.is_archived:
+        quota_released(instance.user_id, 'habits')
+    schedule_user_stats_update(instance.user_id)
+    _record_tombstone(instance.user_id, 'habit', instance.pk)
+
+
+@receiver(post_save, sender=HabitGroup)
+def habit_group_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        quota_added(instance.user_id, 'groups')
+
+
+@receiver(post_delete, sender=HabitGroup)
+def habit_group_deleted(sender, instance, origin=None, **kwargs):
+    if _is_cascade(origin, HabitGroup):
+        return
+    quota_released(instance.user_id, 'groups')
+    _record_tombstone(instance.user_id, 'group', instance.pk)
+
+
+@receiver(post_delete, sender=HabitReminder)
+def habit_reminder_deleted(sender, instance, origin=None, **kwargs):
+    if _is_cascade(origin, HabitReminder):
+        return
+    _record_tombstone(instance.habit.user_id, 'reminder', instance.pk)
@@ -0,0 +1,351 @@
+"""
+Расчёт статистики привычек: серии выполнений и процент выполнения.
+
+Серии считаются в БД по всей истории одним запросом как для одной
+привычки, так и для целой страницы (habit_streaks).
+
+Сохранённые в Habit счётчики (total_completions, total_skips, streak,
+longest_streak) поддерживаются инкрементально: на каждое изменение лога
+читаются только даты вокруг изменённого дня (apply_log_change), полный
+пересчёт (compute_full_stats) выполняется лишь когда без него не обойтись.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Ключ «острова» подряд идущих дат: дата минус её номер по порядку
+# одинакова для всех дней одной серии (gaps-and-islands)
+ISLAND_KEY_SQL = {
+    'sqlite': 'julianday("date") - ROW_NUMBER() OVER (PARTITION BY habit_id ORDER BY "date")',
+    'postgresql': '"date" - CAST(ROW_NUMBER() OVER (PARTITION BY habit_id ORDER BY "date") AS integer)',
+}
+
+STREAKS_SQL = """
+    SELECT habit_id,
+           MAX(run_length),
+           COALESCE(MAX(CASE WHEN run_end = %s THEN run_length END), 0)
+    FROM (
+        SELECT habit_id, COUNT(*) AS run_length, MAX("date") AS run_end
+        FROM (
+            SELECT habit_id, "date", {island_key} AS island
+            FROM ({completed}) AS completed
+        ) AS days
+        GROUP BY habit_id, island
+    ) AS runs
+    GROUP BY habit_id
+"""
+
+
+def completion_rate(completions, skips):
+    """Процент выполнения по количеству выполнений и пропусков"""
+    total = completions + skips
+    if total == 0:
+        return 0
+    return round((completions / total) * 100, 2)
+
+
+class HabitStats(NamedTuple):
+    """Агрегированная статистика привычки"""
+    total_completions: int
+    total_skips: int
+    streak: int
+    longest_streak: int
+
+
+STATS_FIELDS = list(HabitStats._fields)
+
+
+def streaks_from_dates(dates, today):
+    """
+    Текущая и самая длинная серия по отсортированным датам выполнений.
+
+    Учитывается вся история; текущая серия — та, что заканчивается сегодня.
+    """
+    longest = 0
+    run = 0
+    previous = None
+    for date in dates:
+        if previous is not None and date - previous == timedelta(days=1):
+            run += 1
+        else:
+            run = 1
+        longest = max(longest, run)
+        previous = date
+    current = run if previous == today else 0
+    return current, longest
+
+
+def habit_streaks(logs, today=None):
+    """
+    Текущая и самая длинная серия для всех привычек из queryset'а логов.
+
+    Считается одним запросом в БД по всей истории (gaps-and-islands на
+    оконных функциях). Возвращает {habit_id: (текущая, самая длинная)};
+    привычки без выполнений в словарь не попадают.
+    """
+    from .models import HabitLog
+
+    today = today or timezone.localdate()
+    completed = logs.filter(
+        status='completed',
+        date__lte=today,
+    ).order_by().values('habit_id', 'date')
+
+    connection = connections[completed.db]
+    island_key = ISLAND_KEY_SQL.get(connection.vendor)
+    if island_key is None:
+        # Для остальных СУБД — тот же расчёт в Python
+        dates = defaultdict(list)
+        for row in completed.order_by('habit_id', 'date'):
+            dates[row['habit_id']].append(row['date'])
+        return {
+            habit_id: streaks_from_dates(habit_dates, today)
+            for habit_id, habit_dates in dates.items()
+        }
+
+    completed_sql, params = completed.query.sql_with_params()
+    sql = STREAKS_SQL.format(island_key=island_key, completed=completed_sql)
+    habit_id_field = HabitLog._meta.get_field('habit').target_field
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [connection.ops.adapt_datefield_value(today), *params])
+        return {
+            habit_id_field.to_python(habit_id): (current, longest)
+            for habit_id, longest, current in cursor.fetchall()
+        }
+
+
+def attach_streaks(habits, today=None):
+    """
+    Посчитать серии для списка привычек одним запросом.
+
+    Результат кладётся в атрибут ``prefetched_streaks`` каждой привычки
+    в виде кортежа (текущая серия, самая длинная серия).
+    """
+    from .models import HabitLog
+
+    habits = [habit for habit in habits if not hasattr(habit, 'prefetched_streaks')]
+    if not habits:
+        return
+
+    streaks = habit_streaks(HabitLog.objects.filter(habit__in=habits), today)
+    for habit in habits:
+        habit.prefetched_streaks = streaks.get(habit.pk, (0, 0))
+
+
+def compute_full_stats(habit, today=None):
+    """Полный пересчёт статистики привычки по всей истории логов"""
+    counts = habit.logs.aggregate(
+        completed=Count('id', filter=Q(status='completed')),
+        skipped=Count('id', filter=Q(status='skipped')),
+    )
+    current, longest = habit_streaks(habit.logs.all(), today).get(habit.pk, (0, 0))
+    return HabitStats(counts['completed'], counts['skipped'], current, longest)
+
+
+def bulk_compute_stats(habit_ids, today=None):
+    """
+    Полный пересчёт статистики для набора привычек за два запроса:
+    сгруппированные счётчики логов и серии (habit_streaks).
+    """
+    from .models import HabitLog
+
+    logs = HabitLog.objects.filter(habit_id__in=habit_ids)
+    counts = {habit_id: (0, 0) for habit_id in habit_ids}
+    rows = logs.order_by().values('habit_id').annotate(
+        completed=Count('id', filter=Q(status='completed')),
+        skipped=Count('id', filter=Q(status='skipped')),
+    )
+    for row in rows:
+        counts[row['habit_id']] = (row['completed'], row['skipped'])
+    streaks = habit_streaks(logs, today)
+    return {
+        habit_id: HabitStats(*counts[habit_id], *streaks.get(habit_id, (0, 0)))
+        for habit_id in habit_ids
+    }
+
+
+def recompute_habit_stats(habit_ids, today=None):
+    """
+    Пересчитать и сохранить статистику набора привычек через bulk_update.
+
+    Записываются только привычки, у которых статистика изменилась.
+    Возвращает количество обновлённых привычек.
+    """
+    from .models import Habit
+
+    habit_ids = list(habit_ids)
+    stats = bulk_compute_stats(habit_ids, today)
+    now = timezone.now()
+    changed = []
+    for habit in Habit.objects.filter(pk__in=habit_ids).only(*STATS_FIELDS):
+        new_stats = stats[habit.pk]
+        if current_stats(habit) == new_stats:
+            continue
+        for field, value in zip(STATS_FIELDS, new_stats):
+            setattr(habit, field, value)
+        habit.updated_at = now
+        changed.append(habit)
+    Habit.objects.bulk_update(changed, STATS_FIELDS + ['updated_at'])
+    return len(changed)
+
+
+def current_stats(habit):
+    """Статистика, сохранённая в привычке"""
+    return HabitStats(*(getattr(habit, field) for field in STATS_FIELDS))
+
+
+def verify_habit_stats(habit, today=None):
+    """
+    Сравнить сохранённую статистику с полным пересчётом.
+
+    Возвращает словарь расхождений {поле: (сохранено, ожидается)}.
+    """
+    stored = current_stats(habit)
+    expected = compute_full_stats(habit, today)
+    return {
+        field: (getattr(stored, field), getattr(expected, field))
+        for field in STATS_FIELDS
+        if getattr(stored, field) != getattr(expected, field)
+    }
+
+
+def _run_length(dates, start, step):
+    """Длина серии подряд идущих дат из ``dates``, начиная с ``start``"""
+    length = 0
+    day = start
+    while day in dates:
+        length += 1
+        day += step
+    return length
+
+
+def _incremental_streaks(habit, changed_date, added, today):
+    """
+    Пересчитать серии после добавления/удаления выполнения за ``changed_date``.
+
+    Ни одна серия до изменения не длиннее сохранённого longest_streak (L),
+    поэтому достаточно прочитать даты в окнах [d-L-1, d+L+1] и
+    [today-L-1, today]. Если ``changed_date`` не задан, обновляется только
+    текущая серия. Возвращает (streak, longest) или None, если нужен
+    полный пересчёт.
+    """
+    from .models import HabitLog
+
+    limit = habit.longest_streak
+    margin = timedelta(days=limit + 1)
+    window = Q(date__gte=today - margin, date__lte=today)
+    if changed_date is not None:
+        window |= Q(date__gte=changed_date - margin, date__lte=changed_date + margin)
+    dates = set(
+        HabitLog.objects.filter(
+            window,
+            habit=habit,
+            status='completed',
+            date__lte=today,
+        ).order_by().values_list('date', flat=True)
+    )
+
+    one_day = timedelta(days=1)
+    longest = limit
+    merged_until = None
+    if changed_date is not None:
+        dates.discard(changed_date)
+        left = _run_length(dates, changed_date - one_day, -one_day)
+        right = _run_length(dates, changed_date + one_day, one_day)
+        run = left + 1 + right
+        if left > limit or right > limit:
+            # Сохранённая статистика не согласована с логами
+            return None
+        if added:
+            longest = max(limit, run)
+            dates.add(changed_date)
+            merged_until = changed_date + one_day * right
+        elif run >= limit:
+            # Удалили день из самой длинной серии: без полного скана не узнать,
+            # есть ли ещё одна такая же
+            return None
+
+    streak = _run_length(dates, today, -one_day)
+    if streak > limit and merged_until != today:
+        return None
+    return streak, longest
+
+
+def apply_log_change(habit, old=None, new=None, today=None, save=True):
+    """
+    Инкрементально обновить статистику привычки после изменения лога.
+
+    ``old`` и ``new`` — пары (дата, статус) до и после изменения;
+    None означает, что лога не было (создание) или больше нет (удаление).
+
+    При ``save`` строка привычки блокируется, а счётчики перечитываются:
+    объект в памяти может быть устаревшим, и два параллельных запроса
+    иначе записали бы одно и то же значение N+1.
+    """
+    if not save:
+        return _apply_log_change(habit, old, new, today)
+    with transaction.atomic():
+        fresh = type(habit).objects.select_for_update().filter(pk=habit.pk).values(*STATS_FIELDS).first()
+        if fresh is None:
+            # Привычку удалили параллельно — сохранять нечего
+            return current_stats(habit)
+        for field, value in fresh.items():
+            setattr(habit, field, value)
+        stats = _apply_log_change(habit, old, new, today)
+        habit.save(update_fields=STATS_FIELDS + ['updated_at'])
+    return stats
+
+
+def _apply_log_change(habit, old, new, today):
+    """Новая статистика по счётчикам ``habit``; записывается в объект, не в БД"""
+    today = today or timezone.localdate()
+
+    completions = habit.total_completions
+    skips = habit.total_skips
+    for state, sign in ((old, -1), (new, 1)):
+        if state is None:
+            continue
+        if state[1] == 'completed':
+            completions += sign
+        elif state[1] == 'skipped':
+            skips += sign
+
+    removed = old[0] if old and old[1] == 'completed' and old[0] <= today else None
+    added = new[0] if new and new[1] == 'completed' and new[0] <= today else None
+
+    if completions < 0 or skips < 0:
+        streaks = None
+    elif removed and added and removed != added:
+        # Перенос выполнения на другую дату — редкий случай
+        streaks = None
+    elif removed == added:
+        # Серии не изменились, но текущую нужно отсчитать от сегодняшнего дня
+        streaks = _incremental_streaks(habit, None, False, today)
+    else:
+        streaks = _incremental_streaks(habit, added or removed, bool(added), today)
+
+    if streaks is None:
+        stats = compute_full_stats(habit, today)
+    else:
+        stats = HabitStats(completions, skips, *streaks)
+
+    if getattr(settings, 'HABIT_STATS_VERIFY', False):
+        expected = compute_full_stats(habit, today)
+        if stats != expected:
+            logger.warning(
+                'Incremental stats mismatch for habit %s: got %s, expected %s',
+                habit.pk, stats, expected,
+            )
+            stats = expected
+
+    for field, value in zip(STATS_FIELDS, stats):
+        setattr(habit, field, value)
+    return stats
@@ -6,7 +6,9 @@ from django.urls import reverse
 from django.utils import timezone
 from rest_framework.test import APIClient
 
-from habits.models import Habit, HabitGroup, HabitLog
+from analytics.models import DailyUserRollup, UserAnalytics
+from habit_tracker.testing import QueryBudget, QueryBudgetMixin, first_habit
+from habits.models import Habit, HabitGroup, HabitLog, Tombstone
 
 
 User = get_user_model()
@@ -68,3 +70,704 @@ class HabitStreakQueryPerformanceTests(TestCase):
 
         with self.assertNumQueries(1):
             self.assertEqual(self.habit.calculated_longest_streak, 3)
+
+
+class HabitListBatchModeTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='u3', password='pass12345')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.group = HabitGroup.objects.create(user=self.user, name='g3')
+
+    def _create_habits(self, count):
+        today = timezone.localdate()
+        for i in range(count):
+            habit = Habit.objects.create(user=self.user, group=self.group, name=f'h{i}')
+            HabitLog.objects.create(habit=habit, date=today, status='completed')
+            HabitLog.objects.create(habit=habit, date=today - timedelta(days=1), status='skipped')
+            HabitLog.objects.create(habit=habit, date=today - timedelta(days=2), status='completed')
+
+    def _count_list_queries(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(reverse('habit-list'))
+        self.assertEqual(resp.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_list_query_count_does_not_grow_with_habits(self):
+        self._create_habits(2)
+        small = self._count_list_queries()
+        self._create_habits(8)
+        self.assertEqual(self._count_list_queries(), small)
+
+    def test_list_matches_unbatched_serialization(self):
+        from rest_framework.renderers import JSONRenderer
+        from habits.serializers import HabitSerializer
+
+        self._create_habits(3)
+        resp = self.client.get(reverse('habit-list'))
+        results = resp.json()['results']
+        self.assertEqual([item['name'] for item in results], ['h0', 'h1', 'h2'])
+        for item in results:
+            habit = Habit.objects.get(pk=item['id'])
+            expected = JSONRenderer().render(HabitSerializer(habit).data)
+            self.assertEqual(JSONRenderer().render(item), expected)
+
+
+class HabitLogsWindowTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='u4', password='pass12345')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.habit = Habit.objects.create(user=self.user, name='h4')
+        self.today = timezone.localdate()
+        for days in [0, 10, 400]:
+            HabitLog.objects.create(habit=self.habit, date=self.today - timedelta(days=days))
+
+    def _get(self, **params):
+        return self.client.get(reverse('habit-detail', kwargs={'pk': self.habit.pk}), params)
+
+    def test_recent_window_is_default(self):
+        resp = self._get()
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.json()['logs']), 2)
+        # Счётчики считаются по всей истории, а не по окну логов
+        self.assertEqual(resp.json()['total_completions'], 3)
+
+    def test_logs_none_omits_field(self):
+        resp = self.client.get(reverse('habit-list'), {'logs': 'none'})
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotIn('logs', resp.json()['results'][0])
+
+    def test_logs_range(self):
+        resp = self._get(logs='range', to=(self.today - timedelta(days=5)).isoformat())
+        self.assertEqual([log['date'] for log in resp.json()['logs']],
+                         [(self.today - timedelta(days=d)).isoformat() for d in [10, 400]])
+
+    def test_invalid_logs_params(self):
+        self.assertEqual(self._get(logs='all').status_code, 400)
+        self.assertEqual(self._get(logs='range', **{'from': '2024-13-01'}).status_code, 400)
+        resp = self.client.get(reverse('archived-habits'), {'logs': 'all'})
+        self.assertEqual(resp.status_code, 400)
+
+
+class IncrementalHabitStatsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='u5', password='pass12345')
+        self.habit = Habit.objects.create(user=self.user, name='h5')
+        self.today = timezone.localdate()
+
+    def assertStatsMatchFullRecompute(self):
+        from habits.stats import verify_habit_stats
+
+        self.habit.refresh_from_db()
+        self.assertEqual(verify_habit_stats(self.habit), {})
+
+    def test_random_log_changes_match_full_recompute(self):
+        import random
+
+        rng = random.Random(42)
+        logs = {}
+        for _ in range(300):
+            day = self.today - timedelta(days=rng.randrange(20))
+            status = rng.choice(['completed', 'completed', 'skipped', 'partial'])
+            log = logs.get(day)
+            if log is None:
+                logs[day] = HabitLog.objects.create(habit=self.habit, date=day, status=status)
+            elif rng.random() < 0.3:
+                HabitLog.objects.get(pk=log.pk).delete()
+                del logs[day]
+            else:
+                log = HabitLog.objects.get(pk=log.pk)
+                log.status = status
+                log.save()
+            self.assertStatsMatchFullRecompute()
+
+    def test_log_write_does_not_rebuild_for_simple_completion(self):
+        for days in [3, 2, 1]:
+            HabitLog.objects.create(habit=self.habit, date=self.today - timedelta(days=days))
+        other = Habit.objects.create(user=self.user, name='other')
+        HabitLog.objects.create(habit=other, date=self.today, status='skipped')
+        self.habit.refresh_from_db()
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from habit_tracker.testing import TRANSACTION_STATEMENTS
+
+        # SELECT FOR UPDATE счётчиков и SELECT окна дат, один UPDATE привычки,
+        # UPDATE и SELECT дневной сводки, UPDATE счётчиков аналитики, плюс сам INSERT
+        with CaptureQueriesContext(connection) as ctx:
+            HabitLog.objects.create(habit=self.habit, date=self.today)
+        queries = [q['sql'] for q in ctx.captured_queries if not q['sql'].startswith(TRANSACTION_STATEMENTS)]
+        self.assertEqual(len(queries), 7, queries)
+        self.assertEqual(self.habit.streak, 4)
+        self.assertEqual(self.habit.longest_streak, 4)
+
+    def test_writes_through_stale_habit_copies_do_not_lose_updates(self):
+        from habits.stats import verify_habit_stats
+
+        first = Habit.objects.get(pk=self.habit.pk)
+        second = Habit.objects.get(pk=self.habit.pk)
+        # Даты не соседние — обновление идёт инкрементальным путём от счётчиков объекта
+        HabitLog.objects.create(habit=first, date=self.today - timedelta(days=10))
+        # second не знает о первом выполнении — счётчики перечитываются под блокировкой
+        HabitLog.objects.create(habit=second, date=self.today - timedelta(days=20))
+        HabitLog.objects.create(habit=first, date=self.today - timedelta(days=30), status='skipped')
+
+        self.habit.refresh_from_db()
+        self.assertEqual(verify_habit_stats(self.habit), {})
+        self.assertEqual((self.habit.total_completions, self.habit.total_skips), (2, 1))
+
+    def test_longest_streak_is_not_truncated(self):
+        for days in range(400):
+            HabitLog.objects.create(habit=self.habit, date=self.today - timedelta(days=days))
+        self.habit.refresh_from_db()
+        self.assertEqual(self.habit.streak, 400)
+        self.assertEqual(self.habit.longest_streak, 400)
+
+    def test_verification_mode_repairs_inconsistent_stats(self):
+        from django.test import override_settings
+
+        HabitLog.objects.create(habit=self.habit, date=self.today - timedelta(days=1))
+        Habit.objects.filter(pk=self.habit.pk).update(total_completions=10, longest_streak=7)
+        self.habit.refresh_from_db()
+        with override_settings(HABIT_STATS_VERIFY=True), self.assertLogs('habits.stats', 'WARNING'):
+            HabitLog.objects.create(habit=self.habit, date=self.today, status='skipped')
+        self.assertStatsMatchFullRecompute()
+
+    def test_deleting_habit_skips_per_log_updates(self):
+        for days in range(5):
+            HabitLog.objects.create(habit=self.habit, date=self.today - timedelta(days=days))
+        url = reverse('delete-habit', kwargs={'habit_id': self.habit.id})
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        self.assertEqual(client.delete(url).status_code, 200)
+        self.assertFalse(HabitLog.objects.filter(habit_id=self.habit.id).exists())
+
+
+class HabitStreakSqlTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='u6', password='pass12345')
+        self.today = timezone.localdate()
+
+    def test_matches_python_reference_for_many_habits(self):
+        import random
+        from habits.stats import habit_streaks, streaks_from_dates
+
+        rng = random.Random(7)
+        expected = {}
+        logs = []
+        for i in range(5):
+            habit = Habit.objects.create(user=self.user, name=f'h{i}')
+            dates = sorted({self.today - timedelta(days=rng.randrange(800)) for _ in range(300)})
+            if i % 2:
+                dates.append(self.today)
+            logs += [HabitLog(habit=habit, date=d) for d in sorted(set(dates))]
+            expected[habit.pk] = streaks_from_dates(sorted(set(dates)), self.today)
+        HabitLog.objects.bulk_create(logs)
+
+        with self.assertNumQueries(1):
+            result = habit_streaks(HabitLog.objects.filter(habit__user=self.user))
+        self.assertEqual(result, expected)
+
+    def test_calculated_streaks_cover_full_history(self):
+        habit = Habit.objects.create(user=self.user, name='long')
+        HabitLog.objects.bulk_create(
+            HabitLog(habit=habit, date=self.today - timedelta(days=d)) for d in range(500)
+        )
+        self.assertEqual(habit.calculated_streak, 500)
+        self.assertEqual(habit.calculated_longest_streak, 500)
+
+
+class UpdateHabitStatsCommandTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='u7', password='pass12345')
+        self.other = User.objects.create_user(username='u8', password='pass12345')
+        today = timezone.localdate()
+        logs = []
+        for i in range(6):
+            habit = Habit.objects.create(user=self.user if i < 4 else self.other, name=f'h{i}')
+            logs += [HabitLog(habit=habit, date=today - timedelta(days=d)) for d in range(i + 1)]
+            logs.append(HabitLog(habit=habit, date=today - timedelta(days=i + 2), status='skipped'))
+        # bulk_create не вызывает сигналы — статистика остаётся нулевой
+        HabitLog.objects.bulk_create(logs)
+
+    def _run(self, *args):
+        from io import StringIO
+        from django.core.management import call_command
+
+        out = StringIO()
+        call_command('update_habit_stats', *args, stdout=out)
+        return out.getvalue()
+
+    def test_recomputes_stats_in_batches(self):
+        output = self._run('--batch-size', '4')
+        self.assertIn('Обработано 6/6', output)
+        for i, habit in enumerate(Habit.objects.order_by('name')):
+            self.assertEqual(
+                (habit.total_completions, habit.total_skips, habit.streak, habit.longest_streak),
+                (i + 1, 1, i + 1, i + 1),
+            )
+
+    def test_user_filter_and_constant_queries_per_batch(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as ctx:
+            self._run('--user', 'u7', '--batch-size', '100')
+        small = len(ctx.captured_queries)
+        self.assertEqual(Habit.objects.filter(user=self.other, total_completions=0).count(), 2)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self._run('--batch-size', '100', '--since', '2000-01-01')
+        self.assertLessEqual(len(ctx.captured_queries), small + 1)
+
+
+class BulkHabitLogsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='u9', password='pass12345')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.habits = [Habit.objects.create(user=self.user, name=f'h{i}') for i in range(3)]
+        self.today = timezone.localdate()
+        self.url = reverse('habit-logs-bulk')
+
+    def test_upserts_logs_and_recomputes_stats_once(self):
+        HabitLog.objects.create(habit=self.habits[0], date=self.today, status='skipped')
+        ops = [
+            {'habit_id': str(habit.id), 'date': (self.today - timedelta(days=d)).isoformat()}
+            for habit in self.habits for d in range(3)
+        ]
+        ops.append({'habit_id': str(self.habits[1].id), 'date': self.today.isoformat(), 'status': 'partial', 'value': '0.5'})
+
+        resp = self.client.post(self.url, ops, format='json')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()['processed'], 9)
+        self.assertEqual(HabitLog.objects.count(), 9)
+        self.assertEqual(HabitLog.objects.get(habit=self.habits[0], date=self.today).status, 'completed')
+
+        stats = {h.name: (h.total_completions, h.total_skips, h.streak, h.longest_streak)
+                 for h in Habit.objects.all()}
+        self.assertEqual(stats, {'h0': (3, 0, 3, 3), 'h1': (2, 0, 0, 2), 'h2': (3, 0, 3, 3)})
+
+    def test_unexpected_error_is_logged_with_traceback(self):
+        from unittest import mock
+
+        ops = [{'habit_id': str(self.habits[0].id), 'date': self.today.isoformat()}]
+        with mock.patch('habits.views.recompute_habit_stats', side_effect=RuntimeError('boom')), \
+                self.assertLogs('habits.views', 'ERROR') as logs:
+            resp = self.client.post(self.url, ops, format='json')
+        self.assertEqual(resp.status_code, 500)
+        self.assertIn('RuntimeError: boom', logs.output[0])
+        self.assertFalse(HabitLog.objects.exists())
+
+    def test_query_count_does_not_depend_on_operations(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        # Строка аналитики уже есть — иначе первый запрос создаёт её полным пересчётом
+        UserAnalytics.objects.create(user=self.user)
+
+        def run(days):
+            ops = [
+                {'habit_id': str(habit.id), 'date': (self.today - timedelta(days=d)).isoformat()}
+                for habit in self.habits for d in range(days)
+            ]
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.client.post(self.url, ops, format='json').status_code, 200)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(run(2), run(20))
+
+    def test_rejects_foreign_habits(self):
+        other = User.objects.create_user(username='u10', password='pass12345')
+        foreign = Habit.objects.create(user=other, name='foreign')
+        ops = [{'habit_id': str(foreign.id), 'date': self.today.isoformat()},
+               {'habit_id': str(self.habits[0].id), 'date': self.today.isoformat()}]
+        resp = self.client.post(self.url, ops, format='json')
+        self.assertEqual(resp.status_code, 404)
+        self.assertEqual(resp.json()['habit_ids'], [str(foreign.id)])
+        self.assertFalse(HabitLog.objects.exists())
+
+        resp = self.client.post(self.url, [{'habit_id': 'x', 'date': 'y'}], format='json')
+        self.assertEqual(resp.status_code, 400)
+
+
+class SyncChangesTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='u11', password='pass12345')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.group = HabitGroup.objects.create(user=self.user, name='g')
+        self.habit = Habit.objects.create(user=self.user, name='old', group=self.group)
+        self.gone = Habit.objects.create(user=self.user, name='gone')
+        self.today = timezone.localdate()
+        self.log = HabitLog.objects.create(habit=self.habit, date=self.today)
+        self.url = reverse('sync')
+
+    def test_deleting_users_through_queryset_leaves_no_dangling_rows(self):
+        from django.db import connection
+
+        other = User.objects.create_user(username='u11b', password='pass12345')
+        other_habit = Habit.objects.create(user=other, name='kept')
+        HabitLog.objects.create(habit=other_habit, date=self.today)
+
+        # Так удаляет действие админки «удалить выбранные»
+        User.objects.filter(pk=self.user.pk).delete()
+        connection.check_constraints()
+        self.assertFalse(Tombstone.objects.exists())
+        self.assertFalse(DailyUserRollup.objects.filter(user_id=self.user.pk).exists())
+
+        # Удаление привычек QuerySet'ом по-прежнему оставляет tombstone
+        Habit.objects.filter(pk=other_habit.pk).delete()
+        self.assertEqual(
+            list(Tombstone.objects.values_list('object_type', 'object_id')),
+            [('habit', other_habit.pk)],
+        )
+
+    def _age_everything(self):
+        past = timezone.now() - timedelta(hours=1)
+        for model in (HabitGroup, Habit, HabitLog):
+            model.objects.update(updated_at=past)
+
+    def test_full_snapshot_without_cursor(self):
+        resp = self.client.get(self.url)
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()
+        self.assertEqual({h['name'] for h in data['habits']}, {'old', 'gone'})
+        self.assertEqual(len(data['groups']), 1)
+        self.assertEqual(len(data['logs']), 1)
+        self.assertEqual(data['deleted'], {'groups': [], 'habits': [], 'logs': [], 'reminders': []})
+
+    def test_returns_only_changes_and_deletions_after_cursor(self):
+        self._age_everything()
+        cursor = self.client.get(self.url).json()['cursor']
+
+        Habit.objects.create(user=self.user, name='new')
+        log_id = self.log.id
+        self.log.delete()
+        gone_id = self.gone.id
+        self.gone.delete()
+
+        data = self.client.get(self.url, {'since': cursor}).json()
+        # У old пересчиталась статистика после удаления лога
+        self.assertEqual({h['name'] for h in data['habits']}, {'new', 'old'})
+        self.assertEqual(data['groups'], [])
+        self.assertEqual(data['logs'], [])
+        self.assertEqual(data['deleted']['logs'], [str(log_id)])
+        self.assertEqual(data['deleted']['habits'], [str(gone_id)])
+
+    def test_rejects_bad_cursor(self):
+        resp = self.client.get(self.url, {'since': 'yesterday'})
+        self.assertEqual(resp.status_code, 400)
+
+
+class PlanQuotaTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='u12', password='pass12345')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _create(self, name):
+        return self.client.post(reverse('habit-list'), {'name': name}, format='json')
+
+    def test_habit_limit_follows_create_archive_and_delete(self):
+        ids = [self._create(f'h{i}').json()['id'] for i in range(5)]
+        resp = self._create('extra')
+        self.assertEqual(resp.status_code, 403)
+        self.assertEqual(Habit.objects.count(), 5)
+
+        self.client.post(reverse('archive-habit', kwargs={'habit_id': ids[0]}))
+        self.assertEqual(self._create('h5').status_code, 201)
+        resp = self.client.post(reverse('unarchive-habit', kwargs={'habit_id': ids[0]}))
+        self.assertEqual(resp.status_code, 403)
+
+        self.client.delete(reverse('delete-habit', kwargs={'habit_id': ids[1]}))
+        resp = self.client.post(reverse('unarchive-habit', kwargs={'habit_id': ids[0]}))
+        self.assertEqual(resp.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.active_habits_count, 5)
+
+    def test_group_limit_and_counter_without_extra_count_query(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        url = reverse('habit-group-list')
+        for i in range(2):
+            self.assertEqual(self.client.post(url, {'name': f'g{i}'}, format='json').status_code, 201)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.post(url, {'name': 'g2'}, format='json').status_code, 403)
+        # Только условный UPDATE счётчика, без COUNT и INSERT
+        queries = [q['sql'] for q in ctx.captured_queries if 'SAVEPOINT' not in q['sql']]
+        self.assertEqual(len(queries), 1)
+        self.assertTrue(queries[0].startswith('UPDATE "users_user"'))
+        HabitGroup.objects.first().delete()
+        self.assertEqual(self.client.post(url, {'name': 'g3'}, format='json').status_code, 201)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.groups_count, 2)
+
+
+class QueryPlanTests(TestCase):
+    """Основные эндпоинты читают данные по составным индексам"""
+
+    def setUp(self):
+        from django.db import connection
+
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN есть только в SQLite')
+        self.user = User.objects.create_user(username='u13', password='pass12345')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.habit = Habit.objects.create(user=self.user, name='h13')
+        self.today = timezone.localdate()
+        for days in range(1, 4):
+            HabitLog.objects.create(habit=self.habit, date=self.today - timedelta(days=days))
+
+    def query_plans(self, request):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertLess(request().status_code, 400)
+        plans = []
+        with connection.cursor() as cursor:
+            for query in ctx.captured_queries:
+                sql = query['sql'].strip()
+                if sql.startswith('SELECT'):
+                    cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                    plans.extend(row[-1] for row in cursor.fetchall())
+        return '\n'.join(plans)
+
+    def test_habit_list_uses_active_habits_index(self):
+        plans = self.query_plans(lambda: self.client.get(reverse('habit-list')))
+        self.assertIn('USING INDEX habit_user_active_group', plans)
+        self.assertIn('habitlog_habit_status_date', plans)
+
+    def test_complete_uses_status_date_index(self):
+        url = reverse('complete-habit', kwargs={'habit_id': self.habit.id})
+        plans = self.query_plans(lambda: self.client.post(url, {}, format='json'))
+        self.assertIn('USING COVERING INDEX habitlog_habit_status_date', plans)
+
+    def test_subscription_lookup_uses_user_status_index(self):
+        plans = self.query_plans(lambda: self.client.get(reverse('subscription-features')))
+        self.assertIn('USING INDEX subscription_user_status_end', plans)
+
+    def test_log_list_reads_user_index_without_join(self):
+        plans = self.query_plans(lambda: self.client.get(reverse('habit-logs')))
+        self.assertIn('USING INDEX habitlog_user_date', plans)
+
+
+class HabitLogOwnerTests(TestCase):
+    def test_owner_is_copied_from_habit_on_save_and_bulk_create(self):
+        user = User.objects.create_user(username='u14', password='pass12345')
+        habit = Habit.objects.create(user=user, name='h14')
+        today = timezone.localdate()
+        HabitLog.objects.create(habit=habit, date=today)
+        HabitLog.objects.bulk_create([HabitLog(habit=habit, date=today - timedelta(days=1))])
+        self.assertEqual(HabitLog.objects.filter(user=user).count(), 2)
+
+        client = APIClient()
+        client.force_authenticate(user=user)
+        log = client.get(reverse('habit-logs')).json()
+        log = log['results'][0] if isinstance(log, dict) else log[0]
+        self.assertNotIn('user', log)
+
+    def test_owner_follows_habit_when_log_is_moved(self):
+        today = timezone.localdate()
+        owner = User.objects.create_user(username='u15', password='pass12345')
+        other = User.objects.create_user(username='u16', password='pass12345')
+        habit = Habit.objects.create(user=owner, name='h15')
+        other_habit = Habit.objects.create(user=other, name='h16')
+
+        log = HabitLog.objects.create(habit=habit, user=other, date=today)
+        self.assertEqual(log.user_id, owner.pk)
+
+        log = HabitLog.objects.get(pk=log.pk)
+        log.habit = other_habit
+        log.save()
+        self.assertEqual(HabitLog.objects.get(pk=log.pk).user_id, other.pk)
+
+        # Для прежней привычки и её владельца лог удалён, для новой — создан
+        habit.refresh_from_db()
+        other_habit.refresh_from_db()
+        self.assertEqual((habit.total_completions, habit.streak), (0, 0))
+        self.assertEqual((other_habit.total_completions, other_habit.streak), (1, 1))
+        self.assertEqual(self._rollups(owner), {})
+        self.assertEqual(self._rollups(other), {today: 1})
+        self.assertTrue(Tombstone.objects.filter(user=owner, object_type='log', object_id=log.pk).exists())
+
+        # Перенос между привычками одного пользователя
+        third = Habit.objects.create(user=other, name='h17')
+        log = HabitLog.objects.get(pk=log.pk)
+        log.habit = third
+        log.save()
+        other_habit.refresh_from_db()
+        third.refresh_from_db()
+        self.assertEqual((other_habit.total_completions, other_habit.streak), (0, 0))
+        self.assertEqual((third.total_completions, third.streak), (1, 1))
+        self.assertEqual(self._rollups(other), {today: 1})
+
+    def _rollups(self, user):
+        return dict(
+            DailyUserRollup.objects.filter(user=user, completed_count__gt=0)
+            .values_list('date', 'completed_count')
+        )
+
+
+class GenerateRandomLogsCommandTests(TestCase):
+    def _run(self, *args):
+        from io import StringIO
+        from django.core.management import call_command
+
+        out = StringIO()
+        call_command('generate_random_logs', *args, stdout=out)
+        return out.getvalue()
+
+    def test_bulk_path_with_constant_queries_and_overwrite(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from analytics.models import DailyUserRollup
+
+        user = User.objects.create_user(username='u15', password='pass12345')
+        habits = [Habit.objects.create(user=user, name=f'h{i}') for i in range(2)]
+        today = timezone.localdate()
+        HabitLog.objects.create(habit=habits[0], date=today, status='skipped', notes='руками')
+
+        with CaptureQueriesContext(connection) as ctx:
+            output = self._run('--username', 'u15', '--days', '60', '--seed', '1')
+        self.assertIn('Created: 119, Updated: 0', output)
+        # Число запросов не зависит от числа дней и привычек
+        self.assertLess(len(ctx.captured_queries), 40)
+        self.assertEqual(HabitLog.objects.get(habit=habits[0], date=today).notes, 'руками')
+
+        for habit in Habit.objects.filter(user=user):
+            self.assertEqual(
+                habit.total_completions, habit.logs.filter(status='completed').count()
+            )
+        self.assertEqual(
+            sum(DailyUserRollup.objects.filter(user=user).values_list('completed_count', flat=True)),
+            HabitLog.objects.filter(user=user, status='completed').count(),
+        )
+        self.assertTrue(UserAnalytics.objects.filter(user=user, total_days_active__gt=0).exists())
+        user.refresh_from_db()
+        self.assertEqual(
+            user.total_habits_completed,
+            HabitLog.objects.filter(user=user, status='completed').count(),
+        )
+
+        output = self._run('--username', 'u15', '--days', '60', '--overwrite')
+        self.assertIn('Created: 0, Updated: 120', output)
+        self.assertTrue(HabitLog.objects.get(habit=habits[0], date=today).notes.startswith('руками\n'))
+
+    def test_synthetic_users_are_reproducible(self):
+        self._run('--users', '3', '--habits', '2', '--days', '10', '--seed', '7')
+        users = User.objects.filter(username__startswith='loadtest_')
+        self.assertEqual(users.count(), 3)
+        self.assertEqual(Habit.objects.filter(user__in=users).count(), 6)
+        self.assertEqual(set(users.values_list('active_habits_count', flat=True)), {2})
+        self.assertFalse(users[0].has_usable_password())
+        first = list(HabitLog.objects.filter(user__in=users).order_by('user__username', 'habit__name', 'date')
+                     .values_list('status', flat=True))
+        self.assertEqual(len(first), 60)
+
+        # Повторный запуск не создаёт пользователей, а --overwrite с тем же seed даёт те же статусы
+        self._run('--users', '3', '--days', '10', '--seed', '7', '--overwrite')
+        self.assertEqual(User.objects.filter(username__startswith='loadtest_').count(), 3)
+        again = list(HabitLog.objects.filter(user__in=users).order_by('user__username', 'habit__name', 'date')
+                     .values_list('status', flat=True))
+        self.assertEqual(first, again)
+
+
+class BenchmarkCommandTests(TestCase):
+    def test_reports_endpoints_and_rolls_back_changes(self):
+        import json
+        from io import StringIO
+        from django.core.management import call_command
+
+        out = StringIO()
+        call_command(
+            'benchmark', users=2, habits=2, days=10, requests=5, warmup=1, alloc_requests=2,
+            stdout=out, stderr=StringIO(),
+        )
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['dataset']['logs'], 40)
+        self.assertEqual(
+            set(report['endpoints']), {'habits_list', 'habit_complete', 'user_stats', 'weekly_stats'}
+        )
+        for result in report['endpoints'].values():
+            self.assertEqual(result['status_codes'], {'200': 5})
+            self.assertGreater(result['queries']['min'], 0)
+            self.assertLessEqual(result['latency_ms']['p50'], result['latency_ms']['p99'])
+            self.assertIn('p95', result['peak_alloc_kib'])
+        # Отметки из замера habit_complete откатываются
+        self.assertEqual(HabitLog.objects.count(), 40)
+
+
+def _unlogged_date(fixture):
+    # У фикстуры размера N логи есть за последние N дней
+    return {'date': (fixture.today - timedelta(days=len(fixture.habits))).isoformat()}
+
+
+def _bulk_today(fixture):
+    return [
+        {'habit_id': str(habit.pk), 'date': fixture.today.isoformat(), 'status': 'partial'}
+        for habit in fixture.habits
+    ]
+
+
+class HabitsQueryBudgetTests(QueryBudgetMixin, TestCase):
+    query_budgets = [
+        QueryBudget('habit-list', 5),
+        QueryBudget('habit-list', 4, query_string='?logs=none'),
+        QueryBudget('habit-detail', 4, url_args=first_habit),
+        QueryBudget('habit-group-list', 2),
+        QueryBudget('archived-habits', 4),
+        QueryBudget('habit-logs', 2),
+        QueryBudget('complete-habit', 11, method='post', url_args=first_habit, data=_unlogged_date),
+        QueryBudget('complete-habit', 12, method='delete', url_args=first_habit),
+        QueryBudget('habit-logs-bulk', 11, method='post', data=_bulk_today),
+        QueryBudget('sync', 4),
+    ]
+
+
+class RequestMetricsMiddlewareTests(TestCase):
+    def setUp(self):
+        from habit_tracker.metrics import request_histogram
+
+        request_histogram.reset()
+        self.user = User.objects.create_user(username='u16', password='pass12345')
+        habit = Habit.objects.create(user=self.user, name='h16')
+        HabitLog.objects.create(habit=habit, date=timezone.localdate())
+
+    def _client(self, user):
+        client = APIClient()
+        client.force_authenticate(user=user)
+        return client
+
+    def test_disabled_by_default(self):
+        response = self._client(self.user).get(reverse('habit-list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Server-Timing', response)
+
+    def test_server_timing_slow_log_and_histogram(self):
+        with self.settings(REQUEST_METRICS_ENABLED=True, REQUEST_METRICS_SLOW_MS=0):
+            with self.assertLogs('habit_tracker.metrics', 'WARNING') as logs:
+                response = self._client(self.user).get(reverse('habit-list'))
+            timing = response['Server-Timing']
+            self.assertRegex(timing, r'db;dur=[\d.]+;desc="[1-9]\d* queries"')
+            self.assertRegex(timing, r'serializer;dur=[\d.]+, view;dur=[\d.]+')
+            self.assertIn('"url_name": "habit-list"', logs.output[0])
+            self.assertNotIn('"serializer_ms": 0.0,', logs.output[0])
+
+        with self.settings(REQUEST_METRICS_ENABLED=True):
+            self.assertEqual(self._client(self.user).get(reverse('request-metrics')).status_code, 403)
+            staff = User.objects.create_user(username='staff16', password='pass12345', is_staff=True)
+            stats = self._client(staff).get(reverse('request-metrics')).json()['requests']
+            self.assertEqual(stats['habit-list']['count'], 1)
+            self.assertGreater(stats['habit-list']['mean_queries'], 0)
+            self.assertEqual(sum(stats['habit-list']['latency_buckets'].values()), 1)
+
+            self.assertEqual(self._client(staff).delete(reverse('request-metrics')).status_code, 204)
+            stats = self._client(staff).get(reverse('request-metrics')).json()['requests']
+            self.assertNotIn('habit-list', stats)
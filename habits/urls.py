@@ -11,6 +11,7 @@ urlpatterns = [
     # Кастомные действия
     path('archived/', views.archived_habits, name='archived-habits'),
     path('logs/', views.HabitLogListCreateView.as_view(), name='habit-logs'),
+    path('logs/bulk/', views.bulk_habit_logs, name='habit-logs-bulk'),
     path('<uuid:habit_id>/complete/', views.complete_habit, name='complete-habit'),
     path('<uuid:habit_id>/archive/', views.archive_habit, name='archive-habit'),
     path('<uuid:habit_id>/unarchive/', views.unarchive_habit, name='unarchive-habit'),
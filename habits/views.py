@@ -1,13 +1,64 @@
 from rest_framework import generics, permissions, status, viewsets
 from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes, action
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
-from datetime import datetime
-from .models import HabitGroup, Habit, HabitLog, HabitReminder
+from django.utils.dateparse import parse_datetime
+import logging
+from datetime import datetime, timedelta
+from analytics.heatmap import invalidate_heatmaps
+from analytics.rollups import refresh_rollups
+from users.stats import schedule_user_stats_update
+from .models import HabitGroup, Habit, HabitLog, HabitReminder, Tombstone
 from .serializers import (
     HabitGroupSerializer, HabitSerializer, 
-    HabitLogSerializer, HabitReminderSerializer
+    HabitLogSerializer, HabitReminderSerializer,
+    HabitLogBulkItemSerializer, HabitSyncSerializer,
 )
+from .quotas import QuotaExceeded, reserved_quota
+from .stats import recompute_habit_stats
+
+logger = logging.getLogger(__name__)
+
+def get_logs_window(request):
+    """
+    Разобрать параметры вложенных логов: ?logs=none|recent|range&from=&to=
+
+    Возвращает None, если логи не нужны, иначе пару дат (from, to).
+    По умолчанию — последние HABIT_LOGS_RECENT_DAYS дней.
+    """
+    mode = request.query_params.get('logs', 'recent')
+    if mode == 'none':
+        return None
+    if mode == 'recent':
+        today = timezone.now().date()
+        return today - timedelta(days=settings.HABIT_LOGS_RECENT_DAYS - 1), today
+    if mode != 'range':
+        raise ValidationError({'logs': 'Допустимые значения: none, recent, range'})
+
+    window = []
+    for param in ('from', 'to'):
+        value = request.query_params.get(param)
+        if not value:
+            window.append(None)
+            continue
+        try:
+            window.append(datetime.strptime(value, '%Y-%m-%d').date())
+        except ValueError:
+            raise ValidationError({param: 'Неверный формат даты'})
+    if window[0] and window[1] and window[0] > window[1]:
+        raise ValidationError({'from': 'Начало периода позже конца'})
+    return tuple(window)
+
+
+def with_logs_window(queryset, logs_window):
+    """Подгрузить статистику и логи привычек за указанный период"""
+    if logs_window is None:
+        return queryset.with_stats(logs=False)
+    return queryset.with_stats(logs_from=logs_window[0], logs_to=logs_window[1])
+
 
 class HabitGroupViewSet(viewsets.ModelViewSet):
     """ViewSet для групп привычек"""
@@ -18,7 +69,8 @@ class HabitGroupViewSet(viewsets.ModelViewSet):
         return HabitGroup.objects.filter(user=self.request.user)
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        with reserved_quota(self.request.user, 'groups'):
+            serializer.save(user=self.request.user)
 
 class HabitViewSet(viewsets.ModelViewSet):
     """ViewSet для привычек"""
@@ -27,6 +79,8 @@ class HabitViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         queryset = Habit.objects.filter(user=self.request.user, is_archived=False)
+        if self.action in ('list', 'retrieve'):
+            queryset = with_logs_window(queryset, self.get_logs_window())
         
         # Фильтрация по группе
         group_id = self.request.query_params.get('group', None)
@@ -35,41 +89,45 @@ class HabitViewSet(viewsets.ModelViewSet):
         
         return queryset
 
+    def get_logs_window(self):
+        if not hasattr(self, '_logs_window'):
+            self._logs_window = get_logs_window(self.request)
+        return self._logs_window
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action in ('list', 'retrieve'):
+            context['include_logs'] = self.get_logs_window() is not None
+        return context
+
     def perform_create(self, serializer):
-        habit = serializer.save(user=self.request.user)
-        # Обновляем статистику пользователя
-        self.request.user.update_habits_created_count()
+        # Статистика пользователя обновляется сигналами (отложенно)
+        with reserved_quota(self.request.user, 'habits'):
+            serializer.save(user=self.request.user)
 
     @action(detail=True, methods=['post'])
     def complete(self, request, pk=None):
         """Отметить выполнение привычки"""
         habit = self.get_object()
         
-        # Создаем или обновляем лог выполнения
-        prev_status = None
-        log, created = HabitLog.objects.get_or_create(
-            habit=habit,
-            date=timezone.now().date(),
-            defaults={
-                'status': 'completed',
-                'value': request.data.get('value', 1)
-            }
-        )
-        
-        # Если лог уже существовал, обновляем его статус
-        if not created and log.status != 'completed':
-            prev_status = log.status
-            log.status = 'completed'
-            log.value = request.data.get('value', 1)
-            log.save()
-        
-        # Обновляем статистику привычки, если лог создан или изменён статус
-        if created or prev_status is not None:
-            habit.recalculate_stats()
-        
-        # Обновляем статистику пользователя
-        request.user.update_habits_completed_count()
-        request.user.update_streak_stats()
+        # Лог и всё, что обновляют его сигналы, пишутся одной транзакцией
+        with transaction.atomic():
+            # Создаем или обновляем лог выполнения
+            log, created = HabitLog.objects.get_or_create(
+                habit=habit,
+                date=timezone.now().date(),
+                defaults={
+                    'status': 'completed',
+                    'value': request.data.get('value', 1)
+                }
+            )
+            
+            # Если лог уже существовал, обновляем его статус
+            # (статистика привычки обновляется сигналами HabitLog)
+            if not created and log.status != 'completed':
+                log.status = 'completed'
+                log.value = request.data.get('value', 1)
+                log.save()
         
         return Response({'message': 'Привычка выполнена!'}, status=status.HTTP_200_OK)
 
@@ -79,17 +137,79 @@ class HabitLogListCreateView(generics.ListCreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return HabitLog.objects.filter(habit__user=self.request.user)
+        return HabitLog.objects.filter(user=self.request.user).select_related('habit')
 
     def perform_create(self, serializer):
         habit = serializer.validated_data['habit']
         if habit.user != self.request.user:
-            raise permissions.PermissionDenied("Вы не можете создавать логи для чужих привычек")
-        log = serializer.save()
-        
-        # Обновляем статистику пользователя
-        self.request.user.update_habits_completed_count()
-        self.request.user.update_streak_stats()
+            raise PermissionDenied("Вы не можете создавать логи для чужих привычек")
+        # Статистика привычки и пользователя обновляется сигналами HabitLog
+        serializer.save()
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def bulk_habit_logs(request):
+    """
+    Пакетная отметка: список операций {habit_id, date, status, value}.
+
+    Используется для синхронизации офлайн-отметок и отметки целой группы.
+    Логи создаются или обновляются одним upsert, статистика каждой
+    затронутой привычки пересчитывается один раз.
+    """
+    serializer = HabitLogBulkItemSerializer(
+        data=request.data, many=True, max_length=settings.HABIT_LOGS_BULK_LIMIT,
+    )
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        # Повторы одной пары (привычка, дата) схлопываем: побеждает последняя операция
+        operations = {(op['habit_id'], op['date']): op for op in serializer.validated_data}
+        habit_ids = {habit_id for habit_id, _ in operations}
+
+        owned_ids = set(
+            Habit.objects.filter(user=request.user, id__in=habit_ids).values_list('id', flat=True)
+        )
+        missing = habit_ids - owned_ids
+        if missing:
+            return Response({
+                'error': 'Привычки не найдены',
+                'habit_ids': sorted(str(habit_id) for habit_id in missing),
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        logs = [
+            HabitLog(
+                habit_id=op['habit_id'],
+                user=request.user,
+                date=op['date'],
+                status=op['status'],
+                value=op.get('value'),
+            )
+            for op in operations.values()
+        ]
+        with transaction.atomic():
+            HabitLog.objects.bulk_create(
+                logs,
+                update_conflicts=True,
+                unique_fields=['habit', 'date'],
+                update_fields=['status', 'value', 'updated_at'],
+            )
+            # bulk_create не вызывает сигналы — обновляем статистику явно
+            recompute_habit_stats(habit_ids)
+            refresh_rollups(request.user.pk, {date for _, date in operations})
+            invalidate_heatmaps(operations)
+            schedule_user_stats_update(request.user.pk)
+
+        return Response({
+            'message': 'Логи сохранены',
+            'processed': len(logs),
+            'habit_ids': sorted(str(habit_id) for habit_id in habit_ids),
+        }, status=status.HTTP_200_OK)
+
+    except Exception:
+        logger.exception('Bulk habit log write failed for user %s', request.user.pk)
+        return Response({'error': 'Внутренняя ошибка сервера'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 
 @api_view(['POST', 'DELETE'])
 @permission_classes([permissions.IsAuthenticated])
@@ -117,17 +237,10 @@ def complete_habit(request, habit_id):
             ).first()
             
             if existing_log:
-                existing_log.delete()
-                
-                # Обновляем статистику привычки
-                habit.recalculate_stats()
-                
-                # Обновляем статистику пользователя
-                try:
-                    request.user.update_habits_completed_count()
-                    request.user.update_streak_stats()
-                except Exception as e:
-                    print(f"Error updating user stats: {e}")
+                # Статистика привычки и пользователя обновляется сигналом удаления лога
+                existing_log.habit = habit
+                with transaction.atomic():
+                    existing_log.delete()
                 
                 return Response({'message': f'Выполнение привычки {target_date} удалено!'}, status=status.HTTP_200_OK)
             else:
@@ -148,34 +261,24 @@ def complete_habit(request, habit_id):
                     'completed_today': True
                 }, status=status.HTTP_200_OK)
             
-            # Создаем или обновляем лог выполнения
-            prev_status = None
-            log, created = HabitLog.objects.get_or_create(
-                habit=habit,
-                date=target_date,
-                defaults={
-                    'status': 'completed',
-                    'value': request.data.get('value', 1)
-                }
-            )
-            
-            # Если лог уже существовал, обновляем его статус
-            if not created and log.status != 'completed':
-                prev_status = log.status
-                log.status = 'completed'
-                log.value = request.data.get('value', 1)
-                log.save()
-            
-            # Обновляем статистику привычки, если лог создан или изменён статус
-            if created or prev_status is not None:
-                habit.recalculate_stats()
-            
-            # Обновляем статистику пользователя (с обработкой ошибок)
-            try:
-                request.user.update_habits_completed_count()
-                request.user.update_streak_stats()
-            except Exception as e:
-                print(f"Error updating user stats: {e}")
+            # Лог и всё, что обновляют его сигналы, пишутся одной транзакцией
+            with transaction.atomic():
+                # Создаем или обновляем лог выполнения
+                log, created = HabitLog.objects.get_or_create(
+                    habit=habit,
+                    date=target_date,
+                    defaults={
+                        'status': 'completed',
+                        'value': request.data.get('value', 1)
+                    }
+                )
+                
+                # Если лог уже существовал, обновляем его статус
+                # (статистика привычки обновляется сигналами HabitLog)
+                if not created and log.status != 'completed':
+                    log.status = 'completed'
+                    log.value = request.data.get('value', 1)
+                    log.save()
             
             return Response({'message': f'Привычка выполнена {target_date}!'}, status=status.HTTP_200_OK)
         
@@ -220,7 +323,8 @@ def unarchive_habit(request, habit_id):
         if not habit.is_archived:
             return Response({'error': 'Привычка не в архиве'}, status=status.HTTP_400_BAD_REQUEST)
         
-        habit.unarchive()
+        with reserved_quota(request.user, 'habits'):
+            habit.unarchive()
         
         return Response({
             'message': 'Привычка восстановлена из архива',
@@ -229,6 +333,8 @@ def unarchive_habit(request, habit_id):
         
     except Habit.DoesNotExist:
         return Response({'error': 'Привычка не найдена'}, status=status.HTTP_404_NOT_FOUND)
+    except QuotaExceeded as e:
+        return Response({'error': e.detail}, status=status.HTTP_403_FORBIDDEN)
     except Exception as e:
         print(f"Error in unarchive_habit: {e}")
         return Response({'error': 'Внутренняя ошибка сервера'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -239,18 +345,24 @@ def unarchive_habit(request, habit_id):
 def archived_habits(request):
     """Получить список архивных привычек"""
     try:
-        archived_habits = Habit.objects.filter(
-            user=request.user,
-            is_archived=True
+        logs_window = get_logs_window(request)
+        archived_habits = with_logs_window(
+            Habit.objects.filter(user=request.user, is_archived=True),
+            logs_window,
         ).order_by('-archived_at')
         
-        serializer = HabitSerializer(archived_habits, many=True)
+        serializer = HabitSerializer(
+            archived_habits, many=True,
+            context={'include_logs': logs_window is not None},
+        )
         
         return Response({
             'habits': serializer.data,
             'count': len(serializer.data)
         }, status=status.HTTP_200_OK)
         
+    except ValidationError as e:
+        return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         print(f"Error in archived_habits: {e}")
         return Response({'error': 'Внутренняя ошибка сервера'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -263,10 +375,7 @@ def delete_habit(request, habit_id):
     try:
         habit = Habit.objects.get(id=habit_id, user=request.user)
         
-        # Удаляем все связанные логи
-        HabitLog.objects.filter(habit=habit).delete()
-        
-        # Удаляем привычку
+        # Удаляем привычку (логи удаляются каскадно)
         habit.delete()
         
         return Response({
@@ -279,3 +388,64 @@ def delete_habit(request, habit_id):
     except Exception as e:
         print(f"Error in delete_habit: {e}")
         return Response({'error': 'Внутренняя ошибка сервера'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+# Запас на транзакции, закоммиченные после того, как был выдан курсор
+SYNC_CURSOR_OVERLAP = timedelta(seconds=5)
+
+# Ключи раздела deleted в ответе sync_changes
+SYNC_DELETED_KEYS = {
+    'group': 'groups',
+    'habit': 'habits',
+    'log': 'logs',
+    'reminder': 'reminders',
+}
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def sync_changes(request):
+    """
+    Дельта-синхронизация для офлайн-клиентов.
+
+    ?since=<cursor> — вернуть только группы, привычки, логи и напоминания,
+    созданные или изменённые после курсора, и id удалённых объектов.
+    Без since — полный снимок. Курсор для следующего запроса — в поле cursor.
+    Удаление привычки не порождает записей об удалении её логов и
+    напоминаний: клиент удаляет их сам вместе с привычкой.
+    """
+    # Курсор фиксируем до чтения данных, чтобы не пропустить изменения
+    cursor = timezone.now()
+    since = request.query_params.get('since')
+    if since:
+        since = parse_datetime(since)
+        if since is None:
+            return Response({'error': 'Неверный курсор'}, status=status.HTTP_400_BAD_REQUEST)
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+        since -= SYNC_CURSOR_OVERLAP
+
+    user = request.user
+    groups = HabitGroup.objects.filter(user=user)
+    habits = Habit.objects.filter(user=user)
+    logs = HabitLog.objects.filter(user=user).select_related('habit')
+    reminders = HabitReminder.objects.filter(habit__user=user)
+    deleted = {key: [] for key in SYNC_DELETED_KEYS.values()}
+
+    if since:
+        groups = groups.filter(updated_at__gt=since)
+        habits = habits.filter(updated_at__gt=since)
+        logs = logs.filter(updated_at__gt=since)
+        reminders = reminders.filter(updated_at__gt=since)
+        tombstones = Tombstone.objects.filter(user=user, deleted_at__gt=since)
+        for object_type, object_id in tombstones.values_list('object_type', 'object_id'):
+            deleted[SYNC_DELETED_KEYS[object_type]].append(object_id)
+
+    return Response({
+        'cursor': cursor.strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
+        'groups': HabitGroupSerializer(groups, many=True).data,
+        'habits': HabitSyncSerializer(habits, many=True).data,
+        'logs': HabitLogSerializer(logs, many=True).data,
+        'reminders': HabitReminderSerializer(reminders, many=True).data,
+        'deleted': deleted,
+    })
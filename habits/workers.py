@@ -0,0 +1,52 @@
+"""
+Пул процессов для тяжёлых management-команд.
+
+Процессы запускаются через spawn, чтобы не наследовать открытые
+подключения к БД. Модуль не импортирует модели на верхнем уровне:
+его загружают воркеры до django.setup().
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+
+def init_worker():
+    """Инициализация процесса-воркера: настраиваем Django заново"""
+    import django
+
+    django.setup()
+
+
+def process_pool(workers):
+    """Пул из ``workers`` процессов с настроенным Django"""
+    return ProcessPoolExecutor(
+        workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=init_worker,
+    )
+
+
+def recompute_stats_chunk(habit_ids, today):
+    """Пересчитать статистику порции привычек; возвращает (обработано, изменено)"""
+    from .stats import recompute_habit_stats
+
+    return len(habit_ids), recompute_habit_stats(habit_ids, today)
+
+
+def generate_logs_chunk(user_ids, days, completion, overwrite, today, seed=None):
+    """Сгенерировать логи порции пользователей; возвращает (создано, обновлено)"""
+    import random
+
+    from django.contrib.auth import get_user_model
+
+    from .seeding import generate_user_logs
+
+    created = updated = 0
+    for user in get_user_model().objects.filter(pk__in=user_ids).order_by('pk'):
+        # Свой генератор на пользователя: с --seed набор воспроизводим при любом числе воркеров
+        rng = random.Random(f'{seed}:{user.username}' if seed is not None else None)
+        user_created, user_updated = generate_user_logs(
+            user, days, completion, overwrite=overwrite, today=today, rng=rng,
+        )
+        created += user_created
+        updated += user_updated
+    return created, updated
@@ -0,0 +1,150 @@
+"""
+Уровень подписки пользователя и доступные ему функции.
+
+Активная подписка определяется одним запросом и кэшируется по
+пользователю до окончания подписки (но не дольше
+ENTITLEMENT_CACHE_TIMEOUT); кэш сбрасывается при создании, изменении и
+удалении подписок. Уровень дублируется в User.subscription_tier, чтобы
+проверки лимитов (plan_features) не требовали запросов.
+"""
+import math
+from collections import defaultdict
+from typing import NamedTuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils import timezone
+
+FREE_TIER = 'free'
+
+# Функции по уровням подписки
+PLAN_FEATURES = {
+    'free': {
+        'max_habits': 5,
+        'max_groups': 2,
+        'analytics': False,
+        'export': False,
+        'family_sharing': False,
+        'priority_support': False,
+        'custom_themes': False,
+    },
+    'premium': {
+        'max_habits': 50,
+        'max_groups': 10,
+        'analytics': True,
+        'export': True,
+        'family_sharing': False,
+        'priority_support': False,
+        'custom_themes': True,
+    },
+    'family': {
+        'max_habits': 200,
+        'max_groups': 50,
+        'analytics': True,
+        'export': True,
+        'family_sharing': True,
+        'priority_support': True,
+        'custom_themes': True,
+    },
+}
+
+
+class Entitlement(NamedTuple):
+    """Уровень подписки пользователя"""
+    tier: str
+    subscription_id: object = None
+    end_date: object = None
+
+    @property
+    def features(self):
+        return PLAN_FEATURES[self.tier]
+
+
+def entitlement_cache_key(user_id):
+    return f'entitlement:{user_id}'
+
+
+def invalidate_entitlement(user_id):
+    cache.delete(entitlement_cache_key(user_id))
+
+
+def active_subscription(user_id, now=None):
+    """Последняя активная подписка пользователя или None"""
+    from .models import Subscription
+
+    return Subscription.objects.filter(
+        user_id=user_id,
+        status='active',
+        end_date__gte=now or timezone.now(),
+    ).only('id', 'subscription_type', 'end_date').order_by('-created_at').first()
+
+
+def resolve_entitlement(user):
+    """
+    Уровень подписки пользователя — из кэша или одним запросом.
+
+    Если уровень разошёлся с User.subscription_tier, поле обновляется.
+    """
+    key = entitlement_cache_key(user.pk)
+    entitlement = cache.get(key)
+    now = timezone.now()
+    if entitlement is not None and (entitlement.end_date is None or entitlement.end_date >= now):
+        return entitlement
+
+    subscription = active_subscription(user.pk, now)
+    timeout = settings.ENTITLEMENT_CACHE_TIMEOUT
+    if subscription is None:
+        entitlement = Entitlement(FREE_TIER)
+    else:
+        entitlement = Entitlement(subscription.subscription_type, subscription.id, subscription.end_date)
+        timeout = min(timeout, math.ceil((subscription.end_date - now).total_seconds()) + 1)
+    cache.set(key, entitlement, timeout)
+
+    if user.subscription_tier != entitlement.tier:
+        get_user_model().objects.filter(pk=user.pk).update(subscription_tier=entitlement.tier)
+        user.subscription_tier = entitlement.tier
+    return entitlement
+
+
+def refresh_entitlement(user_id):
+    """Сбросить кэш и пересчитать уровень (после изменения подписок)"""
+    invalidate_entitlement(user_id)
+    user = get_user_model().objects.only('pk', 'subscription_tier').get(pk=user_id)
+    return resolve_entitlement(user)
+
+
+def plan_features(user):
+    """Функции по сохранённому уровню подписки — без запросов к БД"""
+    return PLAN_FEATURES.get(user.subscription_tier, PLAN_FEATURES[FREE_TIER])
+
+
+def sync_subscription_tiers(user_ids, now=None):
+    """
+    Привести User.subscription_tier набора пользователей к их активным
+    подпискам и сбросить кэш уровня. Возвращает число изменённых пользователей.
+    """
+    from .models import Subscription
+
+    user_ids = set(user_ids)
+    tiers = dict.fromkeys(user_ids, FREE_TIER)
+    active = Subscription.objects.filter(
+        user_id__in=user_ids,
+        status='active',
+        end_date__gte=now or timezone.now(),
+    ).order_by('created_at').values_list('user_id', 'subscription_type')
+    # Как и в active_subscription, побеждает последняя созданная подписка
+    for user_id, tier in active:
+        tiers[user_id] = tier
+
+    users_by_tier = defaultdict(list)
+    for user_id, tier in tiers.items():
+        users_by_tier[tier].append(user_id)
+    changed = 0
+    for tier, ids in users_by_tier.items():
+        changed += get_user_model().objects.filter(pk__in=ids).exclude(
+            subscription_tier=tier,
+        ).update(subscription_tier=tier)
+
+    cache.delete_many([entitlement_cache_key(user_id) for user_id in user_ids])
+    return changed
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from payments.entitlements import sync_subscription_tiers
+from payments.models import Subscription
+
+class Command(BaseCommand):
+    help = 'Перевести закончившиеся подписки в статус expired и понизить уровень пользователей'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько подписок обрабатывать за один проход (по умолчанию 1000)',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size должен быть больше нуля')
+
+        now = timezone.now()
+        expired = 0
+        downgraded = 0
+        while True:
+            batch = list(
+                # Без сортировки: выборка идёт по индексу (status, end_date)
+                Subscription.objects.filter(status='active', end_date__lt=now)
+                .order_by().values_list('pk', 'user_id')[:batch_size]
+            )
+            if not batch:
+                break
+
+            expired += Subscription.objects.filter(
+                pk__in=[pk for pk, _ in batch],
+                status='active',
+            ).update(status='expired', updated_at=now)
+            downgraded += sync_subscription_tiers({user_id for _, user_id in batch}, now)
+            self.stdout.write(f'Обработано подписок: {expired}')
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Истекло подписок: {expired}, изменён уровень у {downgraded} пользователей')
+        )
@@ -31,6 +31,12 @@ class Subscription(models.Model):
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
         ordering = ['-created_at']
+        indexes = [
+            # Активная подписка пользователя (payments.entitlements)
+            models.Index(fields=['user', 'status', 'end_date'], name='subscription_user_status_end'),
+            # Поиск истёкших подписок (expire_subscriptions)
+            models.Index(fields=['status', 'end_date'], name='subscription_status_end'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.get_subscription_type_display()}"
@@ -0,0 +1,21 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .entitlements import refresh_entitlement
+from .models import Subscription
+
+
+@receiver(post_save, sender=Subscription)
+def subscription_saved(sender, instance, raw=False, **kwargs):
+    """Создание, отмена или продление подписки меняет уровень пользователя"""
+    if raw:
+        return
+    refresh_entitlement(instance.user_id)
+
+
+@receiver(post_delete, sender=Subscription)
+def subscription_deleted(sender, instance, origin=None, **kwargs):
+    # Подписки удалённого пользователя пересчитывать незачем
+    if origin is not None and getattr(origin, 'model', type(origin)) is not Subscription:
+        return
+    refresh_entitlement(instance.user_id)
@@ -1,3 +1,116 @@
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from habit_tracker.testing import QueryBudget, QueryBudgetMixin
+from payments.entitlements import Entitlement, entitlement_cache_key, plan_features, resolve_entitlement
+from payments.models import Subscription
+
+
+User = get_user_model()
+
+
+class EntitlementTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='p1', password='pass12345')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _subscribe(self, subscription_type='premium', days=30):
+        now = timezone.now()
+        return Subscription.objects.create(
+            user=self.user,
+            subscription_type=subscription_type,
+            start_date=now,
+            end_date=now + timedelta(days=days),
+            amount=Decimal('299'),
+        )
+
+    def test_tier_is_cached_and_denormalized(self):
+        self.assertEqual(resolve_entitlement(self.user).tier, 'free')
+        subscription = self._subscribe()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.subscription_tier, 'premium')
+        self.assertEqual(plan_features(self.user)['max_habits'], 50)
+
+        with self.assertNumQueries(0):
+            data = self.client.get(reverse('subscription-features')).json()
+        self.assertEqual(data['subscription_type'], 'premium')
+        self.assertTrue(data['features']['analytics'])
+
+        resp = self.client.post(reverse('cancel-subscription', kwargs={'subscription_id': subscription.id}))
+        self.assertEqual(resp.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.subscription_tier, 'free')
+        self.assertEqual(self.client.get(reverse('current-subscription')).json()['subscription_type'], 'free')
+
+    def test_expired_cache_entry_is_not_served(self):
+        self._subscribe('family')
+        # Подписка истекла, а запись кэша ещё жива
+        past = timezone.now() - timedelta(seconds=1)
+        Subscription.objects.update(end_date=past)
+        cache.set(entitlement_cache_key(self.user.pk), Entitlement('family', None, past))
+        self.user.refresh_from_db()
+        self.assertEqual(resolve_entitlement(self.user).tier, 'free')
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.subscription_tier, 'free')
+
+    def test_current_subscription_recovers_from_stale_cache(self):
+        subscription = self._subscribe('family')
+        # В кэше подписка, удалённая в обход сигналов
+        stale = Entitlement('premium', uuid.UUID(int=1), subscription.end_date)
+        cache.set(entitlement_cache_key(self.user.pk), stale)
+
+        data = self.client.get(reverse('current-subscription')).json()
+        self.assertEqual(data['id'], str(subscription.id))
+        self.assertEqual(data['subscription_type'], 'family')
+
+        Subscription.objects.all()._raw_delete(Subscription.objects.db)
+        data = self.client.get(reverse('current-subscription')).json()
+        self.assertEqual(data['subscription_type'], 'free')
+
+    def test_tier_is_not_writable_through_profile(self):
+        self.client.patch(reverse('user-profile'), {'subscription_tier': 'family'}, format='json')
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.subscription_tier, 'free')
+
+
+class ExpireSubscriptionsCommandTests(TestCase):
+    def test_expires_in_batches_and_downgrades_tiers(self):
+        now = timezone.now()
+        users = [User.objects.create_user(username=f'p{i}', password='pass12345') for i in range(3)]
+        for user in users:
+            Subscription.objects.create(
+                user=user, subscription_type='family', amount=Decimal('1'),
+                start_date=now - timedelta(days=60), end_date=now - timedelta(days=1),
+            )
+        # У третьего есть ещё действующая премиум-подписка
+        Subscription.objects.create(
+            user=users[2], subscription_type='premium', amount=Decimal('1'),
+            start_date=now - timedelta(days=60), end_date=now + timedelta(days=30),
+        )
+        User.objects.update(subscription_tier='family')
+
+        out = StringIO()
+        call_command('expire_subscriptions', batch_size=2, stdout=out)
+        self.assertIn('Истекло подписок: 3, изменён уровень у 3 пользователей', out.getvalue())
+        self.assertEqual(Subscription.objects.filter(status='expired').count(), 3)
+        tiers = dict(User.objects.values_list('username', 'subscription_tier'))
+        self.assertEqual(tiers, {'p0': 'free', 'p1': 'free', 'p2': 'premium'})
+
 
-# Create your tests here.
+class PaymentsQueryBudgetTests(QueryBudgetMixin, TestCase):
+    query_budgets = [
+        QueryBudget('current-subscription', 1),
+        QueryBudget('subscription-features', 1),
+        QueryBudget('subscription-list', 1),
+    ]
@@ -1,7 +1,7 @@
 from rest_framework import generics, permissions, status, viewsets
 from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
-from django.utils import timezone
+from .entitlements import refresh_entitlement, resolve_entitlement
 from .models import Subscription
 from .serializers import SubscriptionSerializer
 
@@ -22,21 +22,23 @@ class SubscriptionViewSet(viewsets.ModelViewSet):
 @permission_classes([permissions.IsAuthenticated])
 def current_subscription(request):
     """Текущая активная подписка пользователя"""
-    try:
-        subscription = Subscription.objects.filter(
-            user=request.user,
-            status='active',
-            end_date__gte=timezone.now()
-        ).latest('created_at')
-        
+    entitlement = resolve_entitlement(request.user)
+    subscription = None
+    if entitlement.subscription_id is not None:
+        subscription = Subscription.objects.filter(pk=entitlement.subscription_id).first()
+        if subscription is None:
+            # Подписку удалили в обход сигналов — уровень устарел, пересчитываем
+            entitlement = refresh_entitlement(request.user.pk)
+            if entitlement.subscription_id is not None:
+                subscription = Subscription.objects.filter(pk=entitlement.subscription_id).first()
+    if subscription is not None:
         serializer = SubscriptionSerializer(subscription)
         return Response(serializer.data)
-    except Subscription.DoesNotExist:
-        return Response({
-            'subscription_type': 'free',
-            'status': 'active',
-            'message': 'Бесплатная подписка'
-        })
+    return Response({
+        'subscription_type': 'free',
+        'status': 'active',
+        'message': 'Бесплатная подписка'
+    })
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
@@ -66,52 +68,10 @@ def cancel_subscription(request, subscription_id):
 @permission_classes([permissions.IsAuthenticated])
 def subscription_features(request):
     """Доступные функции по типу подписки"""
-    user = request.user
-    
-    # Определяем текущий уровень подписки
-    try:
-        active_subscription = Subscription.objects.filter(
-            user=user,
-            status='active',
-            end_date__gte=timezone.now()
-        ).latest('created_at')
-        subscription_type = active_subscription.subscription_type
-    except Subscription.DoesNotExist:
-        subscription_type = 'free'
-    
-    # Функции по уровням подписки
-    features = {
-        'free': {
-            'max_habits': 5,
-            'max_groups': 2,
-            'analytics': False,
-            'export': False,
-            'family_sharing': False,
-            'priority_support': False,
-            'custom_themes': False,
-        },
-        'premium': {
-            'max_habits': 50,
-            'max_groups': 10,
-            'analytics': True,
-            'export': True,
-            'family_sharing': False,
-            'priority_support': False,
-            'custom_themes': True,
-        },
-        'family': {
-            'max_habits': 200,
-            'max_groups': 50,
-            'analytics': True,
-            'export': True,
-            'family_sharing': True,
-            'priority_support': True,
-            'custom_themes': True,
-        }
-    }
+    entitlement = resolve_entitlement(request.user)
     
     return Response({
-        'subscription_type': subscription_type,
-        'features': features[subscription_type],
-        'upgrade_available': subscription_type != 'family'
+        'subscription_type': entitlement.tier,
+        'features': entitlement.features,
+        'upgrade_available': entitlement.tier != 'family'
     })
@@ -1,70 +1,129 @@
 #!/usr/bin/env python
 """
-Тест UUID7 генерации
+Тесты генерации UUID7 (habit_tracker.ids).
+
+Запуск: python manage.py test test_uuid7
+Сравнение скорости с прежней реализацией: python test_uuid7.py --benchmark
 """
 import os
+import sys
+import threading
+import time
+import timeit
+import uuid
+from unittest import mock
+
 import django
 
 # Настройка Django
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'habit_tracker.settings')
 django.setup()
 
-from habit_tracker.settings import uuid7
-from users.models import User
+from django.test import SimpleTestCase, TestCase
+
+from habit_tracker import ids
+from habit_tracker.ids import uuid7, uuid7_batch
 from habits.models import Habit, HabitGroup
+from users.models import User
 
-def test_uuid7():
-    """Тестируем UUID7 генерацию"""
-    print("🔍 Тестируем UUID7...")
-    
-    # Генерируем несколько UUID7
-    uuids = [uuid7() for _ in range(5)]
-    
-    print("\n📋 Сгенерированные UUID7:")
-    for i, uid in enumerate(uuids, 1):
-        print(f"{i}. {uid}")
-    
-    # Проверяем уникальность
-    unique_uuids = set(uuids)
-    print(f"\n✅ Уникальность: {len(uuids)} == {len(unique_uuids)}")
-    
-    # Проверяем сортировку (UUID7 должны быть сортируемы по времени)
-    sorted_uuids = sorted(uuids)
-    print(f"\n📊 Сортировка работает: {uuids == sorted_uuids}")
-    
-    # Тестируем создание пользователя
-    print("\n👤 Тестируем создание пользователя с UUID7...")
-    try:
-        user = User.objects.create_user(
-            username='test_uuid7',
-            email='test@uuid7.com',
-            password='testpass123'
-        )
-        print(f"✅ Пользователь создан с UUID7: {user.id}")
-        
-        # Тестируем создание группы привычек
-        group = HabitGroup.objects.create(
-            user=user,
-            name='Тестовая группа',
-            color='#FF5733'
-        )
-        print(f"✅ Группа создана с UUID7: {group.id}")
-        
-        # Тестируем создание привычки
-        habit = Habit.objects.create(
-            user=user,
-            group=group,
-            name='Тестовая привычка',
-            habit_type='boolean'
+
+def legacy_uuid7():
+    """Прежняя реализация из settings — для сравнения скорости"""
+    import time
+    import random
+
+    timestamp_ms = int(time.time() * 1000)
+    timestamp_bytes = timestamp_ms.to_bytes(6, 'big')
+    random_bytes = random.getrandbits(74).to_bytes(10, 'big')
+    return uuid.UUID(bytes=timestamp_bytes + random_bytes)
+
+
+class UUID7Tests(SimpleTestCase):
+    def test_version_variant_and_timestamp(self):
+        before = time.time_ns() // 1_000_000
+        value = uuid7()
+        after = time.time_ns() // 1_000_000
+        self.assertEqual(value.version, 7)
+        self.assertEqual(value.variant, uuid.RFC_4122)
+        self.assertTrue(before <= value.int >> 80 <= after + 1)
+
+    def test_ids_are_unique_and_strictly_increasing(self):
+        values = [uuid7() for _ in range(20000)] + uuid7_batch(20000) + [uuid7()]
+        self.assertEqual(len(set(values)), len(values))
+        self.assertTrue(all(a < b for a, b in zip(values, values[1:])))
+
+    def test_counter_overflow_and_clock_going_back(self):
+        frozen = time.time_ns()
+        # Состояние генератора восстанавливается после теста
+        with mock.patch.object(ids, '_last_ms', 0), mock.patch.object(ids, '_counter', 0):
+            with mock.patch.object(ids, '_clock', return_value=frozen):
+                values = uuid7_batch(10000)
+            # Часы ушли назад — id продолжают расти
+            with mock.patch.object(ids, '_clock', return_value=frozen - 10 ** 9):
+                values += [uuid7() for _ in range(10)]
+        self.assertTrue(all(a < b for a, b in zip(values, values[1:])))
+        self.assertTrue(all(value.version == 7 for value in values))
+
+    def test_counter_seed_does_not_reuse_rand_b_bits(self):
+        seed = 0x5A5
+        # Пул из одного id: затравка в старших 11 битах, rand_b — нули
+        with mock.patch.object(ids, '_last_ms', 0), mock.patch.object(ids, '_counter', 0), \
+                mock.patch.object(ids, '_pool', seed << 62), mock.patch.object(ids, '_pool_pos', 73):
+            value = uuid7()
+        self.assertEqual((value.int >> 64) & 0xFFF, seed)
+        self.assertEqual(value.int & ((1 << 62) - 1), 0)
+
+    def test_threads_get_distinct_ids(self):
+        results = [[] for _ in range(4)]
+
+        def generate(bucket):
+            bucket.extend(uuid7() for _ in range(5000))
+
+        threads = [threading.Thread(target=generate, args=(bucket,)) for bucket in results]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        values = [value for bucket in results for value in bucket]
+        self.assertEqual(len(set(values)), len(values))
+        for bucket in results:
+            self.assertEqual(bucket, sorted(bucket))
+
+    def test_throughput(self):
+        started = time.perf_counter()
+        uuid7_batch(100000)
+        # С большим запасом: на обычной машине это десятые доли секунды
+        self.assertLess(time.perf_counter() - started, 5)
+
+
+class UUID7ModelTests(TestCase):
+    def test_models_get_increasing_uuid7_keys(self):
+        user = User.objects.create_user(username='test_uuid7', password='testpass123')
+        group = HabitGroup.objects.create(user=user, name='Тестовая группа')
+        habits = [Habit.objects.create(user=user, group=group, name=f'h{i}') for i in range(20)]
+        for obj in [user, group, *habits]:
+            self.assertEqual(obj.id.version, 7)
+        self.assertEqual(
+            list(Habit.objects.order_by('pk').values_list('pk', flat=True)),
+            [habit.pk for habit in habits],
         )
-        print(f"✅ Привычка создана с UUID7: {habit.id}")
-        
-        # Очистка
-        user.delete()
-        print("🧹 Тестовые данные удалены")
-        
-    except Exception as e:
-        print(f"❌ Ошибка: {e}")
+
+
+def benchmark(number=100000):
+    """Сравнить скорость с прежней реализацией"""
+    results = {
+        'legacy_uuid7': min(timeit.repeat(legacy_uuid7, number=number, repeat=5)),
+        'uuid7': min(timeit.repeat(uuid7, number=number, repeat=5)),
+        'uuid7_batch': min(timeit.repeat(lambda: uuid7_batch(number), number=1, repeat=5)),
+    }
+    for name, seconds in results.items():
+        print(f'{name:>14}: {seconds / number * 1e9:8.0f} нс на id')
+
 
 if __name__ == '__main__':
-    test_uuid7()
+    if '--benchmark' in sys.argv:
+        benchmark()
+    else:
+        # Тестовая БД нужна UUID7ModelTests — запускаем через раннер Django
+        from django.core.management import call_command
+        call_command('test', 'test_uuid7')
@@ -0,0 +1,73 @@
+"""
+Базовая management-команда для обхода всех пользователей порциями.
+
+Пользователи перебираются по возрастанию pk (keyset, без OFFSET). После
+каждой порции выводится курсор — id последнего пользователя; его можно
+передать в --after, чтобы продолжить после сбоя.
+"""
+import uuid
+from abc import ABC, abstractmethod
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+
+class UserBatchCommand(BaseCommand, ABC):
+    """
+    Подклассы задают ``handle_batch`` и ``report``; порции по умолчанию —
+    списки id, другой набор задаёт ``get_users``.
+    """
+
+    default_batch_size = 1000
+    batch_help = 'Сколько пользователей обрабатывать за один проход'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=self.default_batch_size,
+            help=f'{self.batch_help} (по умолчанию {self.default_batch_size})',
+        )
+        parser.add_argument(
+            '--after', type=str,
+            help='Продолжить с пользователя, следующего за этим id (курсор из прошлого запуска)',
+        )
+
+    def get_users(self):
+        """Что выбирать для порции: QuerySet пользователей или их pk"""
+        return get_user_model().objects.values_list('pk', flat=True)
+
+    @abstractmethod
+    def handle_batch(self, batch):
+        """Обработать порцию; возвращает число, которое суммируется в итог"""
+
+    @abstractmethod
+    def report(self, processed, total):
+        """Итоговое сообщение по числу пользователей и сумме handle_batch"""
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size должен быть больше нуля')
+
+        cursor = None
+        if options['after']:
+            try:
+                cursor = uuid.UUID(options['after'])
+            except ValueError:
+                raise CommandError('Неверный курсор --after, ожидается UUID пользователя')
+
+        processed = 0
+        total = 0
+        while True:
+            users = self.get_users().order_by('pk')
+            if cursor is not None:
+                users = users.filter(pk__gt=cursor)
+            batch = list(users[:batch_size])
+            if not batch:
+                break
+
+            total += self.handle_batch(batch)
+            processed += len(batch)
+            cursor = getattr(batch[-1], 'pk', batch[-1])
+            self.stdout.write(f'Обработано {processed}, курсор: {cursor}')
+
+        self.stdout.write(self.style.SUCCESS(self.report(processed, total)))
@@ -1,21 +1,19 @@
-from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
 
+from users.management.batching import UserBatchCommand
+from users.stats import USER_STATS_FIELDS, recompute_user_stats
+
 User = get_user_model()
 
-class Command(BaseCommand):
+class Command(UserBatchCommand):
     help = 'Обновить статистику всех пользователей'
+    batch_help = 'Сколько пользователей пересчитывать за один проход'
+
+    def get_users(self):
+        return User.objects.only('pk', *USER_STATS_FIELDS)
+
+    def handle_batch(self, batch):
+        return recompute_user_stats(batch)
 
-    def handle(self, *args, **options):
-        users = User.objects.all()
-        updated_count = 0
-        
-        for user in users:
-            user.update_habits_created_count()
-            user.update_habits_completed_count()
-            user.update_streak_stats()
-            updated_count += 1
-            
-        self.stdout.write(
-            self.style.SUCCESS(f'Успешно обновлена статистика для {updated_count} пользователей')
-        )
+    def report(self, processed, total):
+        return f'Успешно обновлена статистика для {processed} пользователей (изменено: {total})'
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:44
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_per_user(queryset):
+    return Coalesce(
+        Subquery(
+            queryset.filter(user=OuterRef('pk')).order_by().values('user')
+            .annotate(total=Count('id')).values('total')
+        ),
+        0,
+    )
+
+
+def backfill_quota_counters(apps, schema_editor):
+    """Заполнить счётчики одним UPDATE с подзапросами"""
+    User = apps.get_model('users', 'User')
+    Habit = apps.get_model('habits', 'Habit')
+    HabitGroup = apps.get_model('habits', 'HabitGroup')
+    User.objects.update(
+        active_habits_count=count_per_user(Habit.objects.filter(is_archived=False)),
+        groups_count=count_per_user(HabitGroup.objects.all()),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+        ('habits', '0005_tombstone'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='active_habits_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='groups_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_quota_counters, migrations.RunPython.noop),
+    ]
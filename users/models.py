@@ -29,6 +29,10 @@ class User(AbstractUser):
     total_habits_completed = models.PositiveIntegerField(default=0)
     current_streak = models.PositiveIntegerField(default=0)
     longest_streak = models.PositiveIntegerField(default=0)
+
+    # Счётчики для лимитов тарифа (habits.quotas)
+    active_habits_count = models.PositiveIntegerField(default=0)
+    groups_count = models.PositiveIntegerField(default=0)
     
     # Метаданные
     created_at = models.DateTimeField(auto_now_add=True)
@@ -43,15 +47,11 @@ class User(AbstractUser):
     
     @property
     def completion_rate(self):
-        """Процент выполнения привычек"""
-        from habits.models import HabitLog
-        total_attempts = HabitLog.objects.filter(habit__user=self).count()
+        """Процент выполнения привычек (счётчики логов берутся из кэша)"""
+        from .stats import completion_counts
+        total_attempts, completed_attempts = completion_counts(self.pk)
         if total_attempts == 0:
             return 0
-        completed_attempts = HabitLog.objects.filter(
-            habit__user=self, 
-            status='completed'
-        ).count()
         return round((completed_attempts / total_attempts) * 100, 2)
 
     def update_habits_created_count(self):
@@ -64,7 +64,7 @@ class User(AbstractUser):
         """Обновить количество выполненных привычек"""
         from habits.models import HabitLog
         self.total_habits_completed = HabitLog.objects.filter(
-            habit__user=self, 
+            user=self, 
             status='completed'
         ).count()
         self.save(update_fields=['total_habits_completed'])
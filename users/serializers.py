@@ -14,7 +14,7 @@ class UserSerializer(serializers.ModelSerializer):
                  'total_habits_created', 'total_habits_completed', 
                  'current_streak', 'longest_streak', 'completion_rate',
                  'created_at', 'updated_at']
-        read_only_fields = ['id', 'total_habits_created', 'total_habits_completed', 
+        read_only_fields = ['id', 'subscription_tier', 'total_habits_created', 'total_habits_completed', 
                            'current_streak', 'longest_streak', 'completion_rate',
                            'created_at', 'updated_at']
 
@@ -0,0 +1,202 @@
+"""
+Пакетный пересчёт счётчиков статистики пользователей.
+
+Все четыре счётчика (total_habits_created, total_habits_completed,
+current_streak, longest_streak) выводятся из сгруппированных агрегатов
+по Habit и HabitLog, а записываются одним bulk_update на порцию.
+
+Процент выполнения не хранится в User: счётчики логов, из которых он
+считается, кэшируются по пользователю и сбрасываются после коммита
+записи дневных сводок, из которых они читаются.
+
+После записи логов счётчики пересчитываются отложенно и пакетно
+(schedule_user_stats_update), а не внутри запроса.
+"""
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models import Count, F, Max, Sum
+from django.db.models.functions import Coalesce
+
+logger = logging.getLogger(__name__)
+
+USER_STATS_FIELDS = [
+    'total_habits_created',
+    'total_habits_completed',
+    'current_streak',
+    'longest_streak',
+]
+
+
+def stats_cache_key(user_id):
+    return f'user-stats:{user_id}'
+
+
+def completion_counts(user_id):
+    """
+    Количество логов пользователя (всего, выполнено) — из кэша или
+    одним агрегирующим запросом по дневным сводкам.
+    """
+    from analytics.models import DailyUserRollup
+
+    key = stats_cache_key(user_id)
+    counts = cache.get(key)
+    if counts is None:
+        row = DailyUserRollup.objects.filter(user_id=user_id).aggregate(
+            total=Coalesce(Sum(F('completed_count') + F('skipped_count') + F('partial_count')), 0),
+            completed=Coalesce(Sum('completed_count'), 0),
+        )
+        counts = (row['total'], row['completed'])
+        cache.set(key, counts, settings.USER_STATS_CACHE_TIMEOUT)
+    return counts
+
+
+def invalidate_user_stats(user_id):
+    """Сбросить кэш статистики пользователя"""
+    cache.delete(stats_cache_key(user_id))
+
+
+def compute_user_stats(users):
+    """
+    Посчитать счётчики для набора пользователей за два запроса.
+
+    Возвращает {user_id: {поле: значение}}. Семантика совпадает с методами
+    User.update_*: лучшая серия только растёт, а серии не меняются, если
+    у пользователя нет привычек.
+    """
+    from habits.models import Habit, HabitLog
+
+    user_ids = [user.pk for user in users]
+    habits = {
+        row['user_id']: row
+        for row in Habit.objects.filter(user_id__in=user_ids).order_by().values('user_id').annotate(
+            created=Count('id'),
+            max_streak=Max('streak'),
+        )
+    }
+    completed = dict(
+        HabitLog.objects.filter(user_id__in=user_ids, status='completed')
+        .order_by()
+        .values('user_id')
+        .annotate(completed=Count('id'))
+        .values_list('user_id', 'completed')
+    )
+
+    stats = {}
+    for user in users:
+        row = habits.get(user.pk)
+        values = {
+            'total_habits_created': row['created'] if row else 0,
+            'total_habits_completed': completed.get(user.pk, 0),
+            'current_streak': user.current_streak,
+            'longest_streak': user.longest_streak,
+        }
+        if row:
+            values['current_streak'] = row['max_streak']
+            values['longest_streak'] = max(user.longest_streak, row['max_streak'])
+        stats[user.pk] = values
+    return stats
+
+
+def recompute_user_stats(users):
+    """
+    Пересчитать и сохранить счётчики пользователей через bulk_update.
+
+    Записываются только изменившиеся пользователи; возвращает их количество.
+    """
+    from django.contrib.auth import get_user_model
+
+    users = list(users)
+    stats = compute_user_stats(users)
+    changed = []
+    for user in users:
+        values = stats[user.pk]
+        if all(getattr(user, field) == value for field, value in values.items()):
+            continue
+        for field, value in values.items():
+            setattr(user, field, value)
+        changed.append(user)
+    get_user_model().objects.bulk_update(changed, USER_STATS_FIELDS)
+    return len(changed)
+
+
+class DeferredUserStats:
+    """
+    Отложенный пересчёт статистики пользователей.
+
+    Запись лога лишь помечает пользователя «грязным»; раз в
+    USER_STATS_DEBOUNCE_SECONDS фоновый поток пересчитывает всех помеченных
+    одним recompute_user_stats. Пакетная отметка N привычек стоит одного
+    пересчёта вместо N. При нулевом интервале пересчёт синхронный.
+    """
+
+    def __init__(self):
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def mark_dirty(self, user_id):
+        delay = settings.USER_STATS_DEBOUNCE_SECONDS
+        if delay <= 0:
+            self._recompute({user_id})
+            return
+        # Пересчитываем только после коммита, иначе поток не увидит изменений
+        transaction.on_commit(lambda: self._schedule(user_id, delay))
+
+    def _schedule(self, user_id, delay):
+        with self._lock:
+            self._dirty.add(user_id)
+            if self._timer is None:
+                self._timer = threading.Timer(delay, self._flush_in_thread)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """Пересчитать всех помеченных пользователей прямо сейчас"""
+        with self._lock:
+            user_ids, self._dirty = self._dirty, set()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if user_ids:
+            self._recompute(user_ids)
+        return len(user_ids)
+
+    def _flush_in_thread(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Deferred user stats update failed')
+        finally:
+            # У потока таймера собственные подключения к БД
+            connections.close_all()
+
+    def _recompute(self, user_ids):
+        from django.contrib.auth import get_user_model
+
+        users = get_user_model().objects.filter(pk__in=user_ids).only('pk', *USER_STATS_FIELDS)
+        recompute_user_stats(users)
+
+
+user_stats_updater = DeferredUserStats()
+atexit.register(user_stats_updater.flush)
+
+
+def invalidate_user_stats_on_commit(user_id):
+    """
+    Сбросить кэш статистики после коммита текущей транзакции.
+
+    Вызывается после записи дневных сводок: сброс до коммита позволил бы
+    параллельному запросу заново закэшировать старые счётчики.
+    """
+    transaction.on_commit(lambda: invalidate_user_stats(user_id))
+
+
+def schedule_user_stats_update(user_id):
+    """Пометить счётчики пользователя устаревшими: они пересчитываются
+    отложенно, кэш сбрасывается вместе с записью сводок"""
+    user_stats_updater.mark_dirty(user_id)
@@ -1,3 +1,169 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from habit_tracker.testing import QueryBudget, QueryBudgetMixin
+from habits.models import Habit, HabitLog
+from users.stats import USER_STATS_FIELDS
+
+
+User = get_user_model()
+
+
+class UpdateUserStatsCommandTests(TestCase):
+    def setUp(self):
+        today = timezone.localdate()
+        self.users = []
+        for i in range(5):
+            user = User.objects.create_user(username=f'stats{i}', password='pass12345')
+            for j in range(i):
+                habit = Habit.objects.create(user=user, name=f'h{j}')
+                for d in range(j + 1):
+                    HabitLog.objects.create(habit=habit, date=today - timedelta(days=d))
+            self.users.append(user)
+        User.objects.update(total_habits_created=0, total_habits_completed=0, current_streak=0)
+        User.objects.filter(username='stats0').update(longest_streak=9)
+
+    def _expected(self):
+        expected = {}
+        for user in User.objects.all():
+            user.update_habits_created_count()
+            user.update_habits_completed_count()
+            user.update_streak_stats()
+            expected[user.pk] = [getattr(user, field) for field in USER_STATS_FIELDS]
+        return expected
+
+    def _actual(self):
+        return {
+            user.pk: [getattr(user, field) for field in USER_STATS_FIELDS]
+            for user in User.objects.all()
+        }
+
+    def test_bulk_recompute_matches_per_user_methods(self):
+        out = StringIO()
+        call_command('update_user_stats', '--batch-size', '2', stdout=out)
+        actual = self._actual()
+        self.assertEqual(actual, self._expected())
+        self.assertEqual(actual[self.users[0].pk][3], 9)
+
+    def test_resume_from_cursor(self):
+        ordered = list(User.objects.order_by('pk'))
+        out = StringIO()
+        call_command('update_user_stats', '--after', str(ordered[2].pk), stdout=out)
+        self.assertIn('Успешно обновлена статистика для 2 пользователей', out.getvalue())
+        actual = self._actual()
+        self.assertEqual(actual[ordered[0].pk][:3], [0, 0, 0])
+        self.assertEqual(actual[ordered[3].pk], self._expected()[ordered[3].pk])
+
+    def test_batch_commands_reject_invalid_cursor(self):
+        from django.core.management.base import CommandError
+
+        for command in ('update_user_stats', 'rebuild_daily_rollups', 'backfill_user_analytics'):
+            with self.subTest(command=command), self.assertRaises(CommandError):
+                call_command(command, '--after', 'not-a-uuid', stdout=StringIO())
+
+    def test_queries_per_batch_do_not_depend_on_users(self):
+        with self.assertNumQueries(4 * 1 + 1):
+            call_command('update_user_stats', '--batch-size', '10', stdout=StringIO())
+
+
+@override_settings(USER_STATS_DEBOUNCE_SECONDS=0)
+class UserStatsEndpointTests(TestCase):
+    def setUp(self):
+        from rest_framework.test import APIClient
+
+        self.user = User.objects.create_user(username='reader', password='pass12345')
+        self.habit = Habit.objects.create(user=self.user, name='h')
+        HabitLog.objects.create(habit=self.habit, date=timezone.localdate() - timedelta(days=1))
+        HabitLog.objects.create(habit=self.habit, date=timezone.localdate() - timedelta(days=2), status='skipped')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_stats_get_is_read_only_and_cached(self):
+        from django.urls import reverse
+
+        with self.assertNumQueries(1):
+            resp = self.client.get(reverse('user-stats'))
+        self.assertEqual(resp.json()['completion_rate'], 50.0)
+        with self.assertNumQueries(0):
+            self.client.get(reverse('user-stats'))
+        with self.assertNumQueries(0):
+            resp = self.client.get(reverse('user-profile'))
+        self.assertEqual(resp.json()['completion_rate'], 50.0)
+
+    def _stats(self):
+        from django.urls import reverse
+
+        # Как при JWT-аутентификации: пользователь загружается заново на каждый запрос
+        self.client.force_authenticate(user=User.objects.get(pk=self.user.pk))
+        return self.client.get(reverse('user-stats')).json()
+
+    def test_log_writes_invalidate_cached_completion_rate(self):
+        from django.urls import reverse
+
+        self.assertEqual(self._stats()['completion_rate'], 50.0)
+        url = reverse('complete-habit', kwargs={'habit_id': self.habit.id})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url, format='json')
+        resp = self._stats()
+        self.assertEqual(resp['completion_rate'], 66.67)
+        self.assertEqual(resp['total_habits_completed'], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse('delete-habit', kwargs={'habit_id': self.habit.id}))
+        resp = self._stats()
+        self.assertEqual(resp['completion_rate'], 0)
+        self.assertEqual(resp['total_habits_created'], 0)
+        self.assertEqual(resp['total_habits_completed'], 0)
+
+    def test_cache_is_cleared_after_rollup_write_commits(self):
+        from django.core.cache import cache
+        from users.stats import stats_cache_key
+
+        self.assertEqual(self._stats()['completion_rate'], 50.0)
+        with self.captureOnCommitCallbacks(execute=True):
+            HabitLog.objects.create(habit=self.habit, date=timezone.localdate())
+            # Параллельный запрос до коммита кэширует старые счётчики
+            cache.set(stats_cache_key(self.user.pk), (2, 1))
+        self.assertEqual(self._stats()['completion_rate'], 66.67)
+
+
+@override_settings(USER_STATS_DEBOUNCE_SECONDS=60)
+class DeferredUserStatsTests(TestCase):
+    def setUp(self):
+        from users.stats import user_stats_updater
+
+        self.updater = user_stats_updater
+        self.addCleanup(self.updater.flush)
+        self.user = User.objects.create_user(username='bulk', password='pass12345')
+        self.habits = [Habit.objects.create(user=self.user, name=f'h{i}') for i in range(5)]
+
+    def test_log_writes_are_coalesced_into_one_recompute(self):
+        from unittest import mock
+        from users.stats import recompute_user_stats
+
+        today = timezone.localdate()
+        with self.captureOnCommitCallbacks(execute=True):
+            for habit in self.habits:
+                HabitLog.objects.create(habit=habit, date=today)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.total_habits_completed, 0)
+
+        with mock.patch('users.stats.recompute_user_stats', wraps=recompute_user_stats) as recompute:
+            self.assertEqual(self.updater.flush(), 1)
+        recompute.assert_called_once()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.total_habits_created, 5)
+        self.assertEqual(self.user.total_habits_completed, 5)
+        self.assertEqual(self.user.current_streak, 1)
+
+
+class UsersQueryBudgetTests(QueryBudgetMixin, TestCase):
+    query_budgets = [
+        QueryBudget('user-profile', 1),
+        QueryBudget('user-stats', 1),
+    ]
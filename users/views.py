@@ -23,14 +23,14 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def user_stats(request):
-    """Статистика пользователя"""
+    """
+    Статистика пользователя.
+
+    Только чтение: счётчики поддерживаются при записи привычек и логов,
+    процент выполнения берётся из кэша.
+    """
     user = request.user
     
-    # Обновляем статистику
-    user.update_habits_created_count()
-    user.update_habits_completed_count()
-    user.update_streak_stats()
-    
     return Response({
         'total_habits_created': user.total_habits_created,
         'total_habits_completed': user.total_habits_completed,